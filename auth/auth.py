@@ -6,6 +6,11 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from models.model import *
 from database import get_async_session
+from books.rating_stats import remove_ratings
+from books.review_counts import uncount_reviews
+from books.stock import release_carts
+from books.catalog import catalog
+from books.leaderboard import leaderboards
 from auth.schemes import UserLogin, UserDb, UserRegister, GetUSerInfo, AllUserInfo, UserList
 from utilities import *
 from typing import Optional
@@ -223,8 +228,16 @@ async def get_users(
     )
     if not admin.scalar():
         raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
-    result = await session.execute(select(user))
-    return result.fetchall()
+    # only the AllUserInfo columns, the rows go out without another validation pass
+    result = await session.execute(select(
+        user.c.id,
+        user.c.name,
+        user.c.email,
+        user.c.phone_number,
+        user.c.is_admin,
+        user.c.date_joined,
+    ).order_by(user.c.id))
+    return FastJSONResponse([dict(row._mapping) for row in result.fetchall()])
 
 
 @register_router.delete('/delete-user')
@@ -250,16 +263,30 @@ async def delete_user(user_id:int,
     if not is_user.scalar():
         raise HTTPException(status_code=404, detail="User not found")
 
+    rated = await session.execute(
+        select(rate.c.book_id, rate.c.rating, rate.c.created_at).where(rate.c.user_id == user_id)
+    )
+    ratings = [row for row in rated.fetchall() if row.book_id is not None]
+    rated_book_ids = sorted({row.book_id for row in ratings})
+
+    await remove_ratings(session, rate.c.user_id == user_id)
     await session.execute(delete(rate).where(rate.c.user_id == user_id))
+    await uncount_reviews(session, review.c.user_id == user_id)
     await session.execute(delete(review).where(review.c.user_id == user_id))
-    await session.execute(delete(shopping_cart).where(shopping_cart.c.user_id == user_id))
+    # the orders reference the cart lines, they go first
     await session.execute(delete(order).where(order.c.user_id == user_id))
+    await release_carts(session, shopping_cart.c.user_id == user_id)
+    await session.execute(delete(shopping_cart).where(shopping_cart.c.user_id == user_id))
     await session.execute(delete(wishlist).where(wishlist.c.user_id == user_id))
     await session.execute(delete(superuser).where(superuser.c.user_id == user_id))
     await session.execute(delete(user_address).where(user_address.c.user_id == user_id))
 
     await session.execute(delete(user).where(user.c.id == user_id))
     await session.commit()
+    # their ratings no longer count towards the books' averages and rankings
+    if rated_book_ids:
+        await catalog.refresh_book(session, *rated_book_ids)
+        leaderboards.forget_ratings(ratings)
     return {'success': True, 'message': 'User deleted successfully!'}
 
 
@@ -0,0 +1,112 @@
+"""
+Trigram fuzzy search vs the old ILIKE scan on a 1M-row copy of `books`.
+
+The ILIKE baseline is the query substring search used to run, with no
+LIMIT, and it is timed before the trigram indexes exist: gin_trgm_ops
+serves ILIKE '%q%' as well, and would speed up the baseline.
+
+    python -m benchmarks.bench_fuzzy_search [rows]
+
+Uses the database from .env, works on a scratch table `bench_books`
+(dropped at the end) and needs the pg_trgm extension to be installable.
+"""
+import asyncio
+import sys
+import time
+
+from sqlalchemy import text
+
+from database import engine
+
+ROWS = 1_000_000
+RUNS = 20
+
+WORDS = [
+    'Война', 'мир', 'Сказки', 'Пушкин', 'Колобок', 'Энциклопедия', 'космос', 'динозавры', 'English',
+    'Alphabet', 'Harry', 'Potter', 'Ertaklar', 'Alisher', 'Navoiy', 'Kitob', 'Bolalar', 'uchun',
+]
+AUTHORS = [
+    'Лев Толстой', 'Александр Пушкин', 'Корней Чуковский', 'Самуил Маршак', 'Agatha Christie',
+    'Joanne Rowling', 'Alisher Navoiy', "Abdulla Qodiriy", "O'tkir Hoshimov", 'Hans Christian Andersen',
+]
+
+# misspelled the way customers type them
+QUERIES = ['Чуковкий', 'Пушкн', 'Rowlng', 'Navoi', 'Андерсен', 'Колобк']
+
+SETUP = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'DROP TABLE IF EXISTS bench_books',
+    'CREATE UNLOGGED TABLE bench_books (id serial PRIMARY KEY, title varchar, author varchar)',
+    """
+    INSERT INTO bench_books (title, author)
+    SELECT words[1 + (i * 7) % array_length(words, 1)] || ' ' ||
+           words[1 + (i * 13) % array_length(words, 1)] || ' ' || i,
+           authors[1 + i % array_length(authors, 1)]
+    FROM generate_series(1, :rows) AS i,
+         (SELECT CAST(:words AS varchar[]) AS words, CAST(:authors AS varchar[]) AS authors) AS lists
+    """,
+    'CREATE INDEX ON bench_books (title)',
+    'CREATE INDEX ON bench_books (author)',
+    'ANALYZE bench_books',
+]
+
+TRIGRAM_INDEXES = [
+    'CREATE INDEX ON bench_books USING gin (title gin_trgm_ops)',
+    'CREATE INDEX ON bench_books USING gin (author gin_trgm_ops)',
+    'ANALYZE bench_books',
+]
+
+ILIKE = text("""
+    SELECT id FROM bench_books
+    WHERE title ILIKE :pattern OR author ILIKE :pattern
+    ORDER BY id
+""")
+
+FUZZY = text("""
+    SELECT id FROM bench_books
+    WHERE title % :query OR author % :query
+    ORDER BY greatest(similarity(title, :query), similarity(author, :query)) DESC, id
+    LIMIT 20
+""")
+
+
+async def timed(connection, statement, params):
+    started = time.perf_counter()
+    rows = (await connection.execute(statement, params)).fetchall()
+    return time.perf_counter() - started, len(rows)
+
+
+async def main(rows: int):
+    async with engine.begin() as connection:
+        print(f'loading {rows} rows ...')
+        for statement in SETUP:
+            await connection.execute(text(statement), {'rows': rows, 'words': WORDS, 'authors': AUTHORS})
+
+    try:
+        async with engine.connect() as connection:
+            ilike = {
+                query: [await timed(connection, ILIKE, {'pattern': f'%{query}%'}) for _ in range(RUNS)]
+                for query in QUERIES
+            }
+
+        async with engine.begin() as connection:
+            print('building trigram indexes ...')
+            for statement in TRIGRAM_INDEXES:
+                await connection.execute(text(statement))
+
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT set_config('pg_trgm.similarity_threshold', '0.3', false)"))
+            for query in QUERIES:
+                fuzzy = [await timed(connection, FUZZY, {'query': query}) for _ in range(RUNS)]
+                print(
+                    f'{query:>12}: ILIKE {min(t for t, _ in ilike[query]) * 1000:8.1f} ms ({ilike[query][0][1]} rows)   '
+                    f'trigram {min(t for t, _ in fuzzy) * 1000:8.1f} ms ({fuzzy[0][1]} rows)'
+                )
+    finally:
+        async with engine.begin() as connection:
+            await connection.execute(text('DROP TABLE IF EXISTS bench_books'))
+        await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else ROWS))
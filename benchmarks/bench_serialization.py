@@ -0,0 +1,64 @@
+"""
+Serialization cost of a 10k-book /search-books response.
+
+    python -m benchmarks.bench_serialization
+
+"default" is what FastAPI does for a route with response_model=List[BooksList]
+returning plain dicts: validate every row, jsonable_encoder, json.dumps.
+"fast" is returning FastJSONResponse with the same rows.
+"""
+import json
+import timeit
+from datetime import date
+from decimal import Decimal
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from scheme import BooksList
+from utilities import FastJSONResponse
+
+BOOKS = 10_000
+ROUNDS = 5
+
+
+def make_rows():
+    return [
+        {
+            "id": i,
+            "special_book_id": 100000 + i,
+            "title": f"Book title {i}",
+            "author": f"Author {i % 500}",
+            "publication_date": date(2000 + i % 24, 1 + i % 12, 1 + i % 28),
+            "quantity": i % 40,
+            "description": "description is not available",
+            "price": 25000.0 + i,
+            "barcode": f"{4780000000000 + i}",
+            "language": "Russian",
+            "category": "Энциклопедии",
+            "average_rating": Decimal("4.5"),
+            "photo_url": [f"/static/images/{i}.jpg", f"/static/images/{i}_back.jpg"],
+        }
+        for i in range(BOOKS)
+    ]
+
+
+def main():
+    rows = make_rows()
+    adapter = TypeAdapter(List[BooksList])
+
+    def default_path():
+        validated = adapter.validate_python(rows)
+        return json.dumps(jsonable_encoder(validated), ensure_ascii=False).encode()
+
+    def fast_path():
+        return FastJSONResponse(rows).body
+
+    for name, path in (("default", default_path), ("fast", fast_path)):
+        best = min(timeit.repeat(path, number=1, repeat=ROUNDS))
+        print(f"{name:>8}: {best * 1000:8.1f} ms  ({len(path())} bytes)")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,31 @@
-from datetime import datetime
+import datetime as dt
+from decimal import Decimal
+from typing import Optional, List
 
-from sqlalchemy import update, select, func, delete, insert
+from sqlalchemy import update, select, func, delete, insert, tuple_, values, column, case, cast, bindparam, \
+    any_, Integer, String
+from sqlalchemy.dialects.postgresql import ARRAY
 from starlette import status
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Request
+from fastapi.responses import FileResponse, StreamingResponse
 
 from sqlalchemy.ext.asyncio import AsyncSession
-from utilities import verify_token
-from database import get_async_session
-from models.model import book, user, categories, rate, review, images, superuser,books_in_ages
+from utilities import verify_token, encode_cursor, decode_cursor, dumps, render
+from database import get_async_session, async_session_maker
+from models.model import book, user, categories, rate, review, images, superuser,books_in_ages, shopping_cart, \
+    wishlist, book_rating_stats, order
 from category.scheme import CategoryEnum, AgesEnum
+from books.catalog import catalog
+from books.importer import import_books
+from books.lookup import lookup_books
+from books import stock
+from books.queries import hydrated_books_query, book_rating, parse_fields, book_row_to_dict
 import aiofiles
 from utilities import UPLOAD_DIR
 
 from dateutil.parser import parse
+import csv
+import io
 import os
 
 
@@ -121,79 +133,278 @@ async def add_book(
                             detail='This book is already associated with the selected age category')
 
     await session.commit()
+    await catalog.refresh_book(session, new_book_id)
 
     return {"message": "Book added successfully"}
 
 
+@BOOK_router.post('/bulk-import')
+async def bulk_import_books(
+        import_format: ImportFormatEnum = ImportFormatEnum.csv,
+        file: UploadFile = File(...),
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_async_session)
+):
+    if token is None:
+        raise HTTPException(status_code=403, detail='Forbidden')
+
+    user_id = token.get('user_id')
+    result = await session.execute(
+        select(user).where(
+            (user.c.id == user_id) &
+            (user.c.is_admin == True)
+        )
+    )
+    if not result.scalar():
+        raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    report = await import_books(session, file.file, import_format)
+    await session.commit()
+    if report["imported"]:
+        catalog.invalidate()
+
+    return report
+
+
+BROWSE_PAGE_SIZE = 20
+
+
+# field carrying each sort order's value, it goes into the cursor
+SORT_FIELDS = {
+    BookSortEnum.id: 'id',
+    BookSortEnum.newest: 'added_at',
+    BookSortEnum.price_asc: 'price',
+    BookSortEnum.price_desc: 'price',
+    BookSortEnum.rating: 'average_rating',
+}
+
+
+def _parse_cursor_value(sort: BookSortEnum, value):
+    if value is None:
+        return None
+    if sort == BookSortEnum.newest:
+        # books.scheme's star import rebinds `datetime` to the module, hence the alias
+        return dt.datetime.fromisoformat(value)
+    if sort in (BookSortEnum.price_asc, BookSortEnum.price_desc):
+        return float(value)
+    if sort == BookSortEnum.rating:
+        return Decimal(str(value))
+    return int(value)
+
+
+async def _browse_books(
+        session: AsyncSession,
+        sort: BookSortEnum,
+        limit: int,
+        cursor: Optional[str],
+        fields: Optional[set]
+):
+    average_rating = func.coalesce(book_rating(), 0)
+
+    # (sort column, descending, nullable) - book.id is always the tie-breaker
+    sort_column, descending, nullable = {
+        BookSortEnum.id: (book.c.id, False, False),
+        BookSortEnum.newest: (book.c.added_at, True, True),
+        BookSortEnum.price_asc: (book.c.price, False, True),
+        BookSortEnum.price_desc: (book.c.price, True, True),
+        BookSortEnum.rating: (average_rating, True, False),
+    }[sort]
+
+    # the sort value has to be selected for the next cursor even if the client didn't ask for it
+    selected_fields = None
+    if fields is not None:
+        selected_fields = fields | {SORT_FIELDS[sort]}
+    query = hydrated_books_query(average_rating, selected_fields)
+
+    last_value = last_id = None
+    if cursor is not None:
+        values = decode_cursor(cursor)
+        try:
+            if sort == BookSortEnum.id:
+                last_id = int(values[0])
+            else:
+                last_value, last_id = _parse_cursor_value(sort, values[0]), int(values[1])
+        except (ValueError, TypeError, IndexError, ArithmeticError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail='Invalid cursor')
+
+    def after_id(book_id):
+        return book.c.id < book_id if descending else book.c.id > book_id
+
+    id_order = book.c.id.desc() if descending else book.c.id
+
+    # NULL sort values (price, added_at) come last, ordered by id among themselves. The values
+    # and the NULLs are read by separate queries, each one range of the sort's index; the
+    # NULLs only when the values ran out. One extra row tells us whether there is a next page.
+    in_nulls = nullable and last_id is not None and last_value is None
+    books_list = []
+    if not in_nulls:
+        page = query
+        if nullable:
+            page = page.where(sort_column.is_not(None))
+        if last_id is not None:
+            if sort == BookSortEnum.id:
+                page = page.where(after_id(last_id))
+            else:
+                position, last_position = tuple_(sort_column, book.c.id), tuple_(last_value, last_id)
+                page = page.where(position < last_position if descending else position > last_position)
+        sort_order = sort_column.desc().nulls_last() if descending else sort_column.asc().nulls_last()
+        result = await session.execute(page.order_by(sort_order, id_order).limit(limit + 1))
+        books_list = result.fetchall()
+        # the NULLs, if we get to them, are read from their start
+        last_id = None
+
+    if nullable and len(books_list) <= limit:
+        page = query.where(sort_column.is_(None))
+        if last_id is not None:
+            page = page.where(after_id(last_id))
+        result = await session.execute(page.order_by(id_order).limit(limit + 1 - len(books_list)))
+        books_list = books_list + result.fetchall()
+
+    next_cursor = None
+    if len(books_list) > limit:
+        books_list = books_list[:limit]
+        last = books_list[-1]
+        if sort == BookSortEnum.id:
+            next_cursor = encode_cursor(last.id)
+        else:
+            # only the sort column is guaranteed to be selected when fields are projected
+            last_value = getattr(last, SORT_FIELDS[sort])
+            next_cursor = encode_cursor(last_value, last.id)
+
+    return {
+        "books": [book_row_to_dict(b, fields) for b in books_list],
+        "next_cursor": next_cursor
+    }
+
+
 @BOOK_router.get('/get-books')
-async def get_books(session: AsyncSession = Depends(get_async_session)):
-
-    query = select(
-        book.c.id,
-        book.c.special_book_id,
-        book.c.title,
-        book.c.author,
-        book.c.publication_date,
-        book.c.quantity,
-        book.c.description,
-        book.c.price,
-        book.c.barcode,
-        book.c.language,
-        book.c.category,
-        book.c.added_at,
-        func.coalesce(func.round(func.avg(rate.c.rating), 1), 1).label('average_rating')
-    ).join(
-        rate, rate.c.book_id == book.c.id, isouter=True
-    ).group_by(
-        book.c.id
-    ).order_by(
-        book.c.id
+async def get_books(
+        request: Request,
+        limit: Optional[int] = Query(None, ge=1, le=100),
+        sort: BookSortEnum = BookSortEnum.id,
+        cursor: Optional[str] = None,
+        fields: Optional[str] = Query(None, description='Comma separated list of fields to return'),
+        session: AsyncSession = Depends(get_async_session)
+):
+    fields = parse_fields(fields)
+
+    # browse mode: keyset pagination, pass next_cursor back to get the following page;
+    # the full list comes from the snapshot in id order, any other sort is browsed
+    if limit is not None or cursor is not None or sort != BookSortEnum.id:
+        page = await _browse_books(session, sort, limit or BROWSE_PAGE_SIZE, cursor, fields)
+        return render(request, page)
+
+    books = await catalog.get_books(session)
+    if catalog.not_modified(request):
+        return catalog.not_modified_response()
+
+    return render(
+        request,
+        [record.to_dict(fields) for record in books.values()],
+        headers={'ETag': catalog.etag()}
     )
-    books = await session.execute(query)
-    books_list = books.fetchall()
-
-    book_ids = [b.id for b in books_list]
-
-    photo_query = select(images).where(images.c.book_id.in_(book_ids))
-    photo_result = await session.execute(photo_query)
-    photos_by_book_id = {book_id: [] for book_id in book_ids}
-
-    for photo in photo_result.fetchall():
-        photos_by_book_id[photo.book_id].append(photo.photo_url)
-
-    age_query = select(
-        books_in_ages.c.book_id,
-        books_in_ages.c.ages
-    ).where(books_in_ages.c.book_id.in_(book_ids))
-
-    age_result = await session.execute(age_query)
-    ages_by_book_id = {book_id: [] for book_id in book_ids}
-
-    for age in age_result.fetchall():
-        ages_by_book_id[age.book_id].append(age.ages)
-
-    books_list = [
-        {
-            "id": b.id,
-            "special_book_id": b.special_book_id,
-            "title": b.title,
-            "author": b.author,
-            "publication_date": b.publication_date,
-            "quantity": b.quantity,
-            "description": b.description,
-            "price": b.price,
-            "barcode": b.barcode,
-            "language": b.language,
-            "ages": ages_by_book_id.get(b.id),
-            "category": b.category,
-            "average_rating": b.average_rating if b.average_rating is not None else 0,
-            "added_at": b.added_at.strftime('%Y-%m-%d %H:%M:%S') if b.added_at else None,
-            "photos": photos_by_book_id.get(b.id)
-        }
-        for b in books_list
-    ]
-
-    return books_list
+
+
+@BOOK_router.get('/lookup')
+async def lookup_book(
+        barcode: Optional[str] = None,
+        special_book_id: Optional[int] = None,
+        session: AsyncSession = Depends(get_async_session)
+):
+    if (barcode is None) == (special_book_id is None):
+        raise HTTPException(status_code=400, detail='Provide exactly one of barcode or special_book_id')
+
+    barcodes, special_ids = await lookup_books(
+        session,
+        [barcode] if barcode is not None else [],
+        [special_book_id] if special_book_id is not None else []
+    )
+    found = barcodes.get(barcode) if barcode is not None else special_ids.get(special_book_id)
+    if found is None:
+        raise HTTPException(status_code=404, detail='Book not found')
+    return found
+
+
+@BOOK_router.post('/lookup/batch')
+async def lookup_books_batch(
+        codes: BookLookupBatch,
+        session: AsyncSession = Depends(get_async_session)
+):
+    # unknown codes map to null
+    barcodes, special_ids = await lookup_books(session, codes.barcodes, codes.special_book_ids)
+    return {"barcodes": barcodes, "special_book_ids": special_ids}
+
+
+EXPORT_CHUNK_SIZE = 1000
+EXPORT_CSV_COLUMNS = [
+    "id", "special_book_id", "title", "author", "publication_date", "quantity", "description",
+    "price", "barcode", "language", "ages", "category", "average_rating", "added_at", "photos"
+]
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(values)
+    return buffer.getvalue().encode()
+
+
+async def _export_books(export_format: ExportFormatEnum):
+    # the request session is already closed while the response streams, so use our own
+    async with async_session_maker() as session:
+        query = hydrated_books_query(
+            func.coalesce(book_rating(), 0)
+        ).order_by(book.c.id).execution_options(yield_per=EXPORT_CHUNK_SIZE)
+
+        if export_format == ExportFormatEnum.csv:
+            yield _csv_line(EXPORT_CSV_COLUMNS)
+
+        # server-side cursor: only one chunk of books (with its photos/ages) is in memory at a time
+        result = await session.stream(query)
+        async for chunk in result.partitions(EXPORT_CHUNK_SIZE):
+            books_list = [book_row_to_dict(b) for b in chunk]
+            if export_format == ExportFormatEnum.csv:
+                yield b"".join(
+                    _csv_line([
+                        "|".join(b[column] or []) if column in ("ages", "photos") else b[column]
+                        for column in EXPORT_CSV_COLUMNS
+                    ])
+                    for b in books_list
+                )
+            else:
+                yield b"".join(dumps(b) + b"\n" for b in books_list)
+
+
+@BOOK_router.get('/export-books')
+async def export_books(
+        export_format: ExportFormatEnum = ExportFormatEnum.ndjson,
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_async_session)
+):
+    if token is None:
+        raise HTTPException(status_code=403, detail='Forbidden')
+
+    user_id = token.get('user_id')
+    result = await session.execute(
+        select(user).where(
+            (user.c.id == user_id) &
+            (user.c.is_admin == True)
+        )
+    )
+    if not result.scalar():
+        raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    if export_format == ExportFormatEnum.csv:
+        media_type, file_name = 'text/csv', 'books.csv'
+    else:
+        media_type, file_name = 'application/x-ndjson', 'books.ndjson'
+
+    return StreamingResponse(
+        _export_books(export_format),
+        media_type=media_type,
+        headers={'Content-Disposition': f'attachment; filename="{file_name}"'}
+    )
+
+
 @BOOK_router.delete('/delete-book')
 async def delete_book(
         book_id: int,
@@ -226,16 +437,91 @@ async def delete_book(
 
     # Delete associated reviews, ratings, and images
     await session.execute(delete(rate).where(rate.c.book_id == book_id))
+    await session.execute(delete(book_rating_stats).where(book_rating_stats.c.book_id == book_id))
     await session.execute(delete(review).where(review.c.book_id == book_id))
     await session.execute(delete(images).where(images.c.book_id == book_id))
 
     # Finally, delete the book
     await session.execute(delete(book).where(book.c.id == book_id))
     await session.commit()
+    catalog.remove(book_id)
 
     return {"message": "Book deleted successfully"}
 
 
+# ordered book ids named in the 409 of /bulk-delete
+ORDERED_REPORT_LIMIT = 20
+
+
+@BOOK_router.post('/bulk-delete')
+async def bulk_delete_books(
+        criteria: BulkDeleteBooks,
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_async_session)
+):
+    if token is None:
+        raise HTTPException(status_code=403, detail='Forbidden')
+
+    user_id = token.get('user_id')
+    user_check = await session.execute(
+        select(user).where(
+            (user.c.id == user_id) &
+            (user.c.is_admin == True)
+        )
+    )
+
+    if not user_check.scalar():
+        raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    conditions = []
+    if criteria.book_ids:
+        conditions.append(book.c.id == any_(bindparam('requested_ids', criteria.book_ids, type_=ARRAY(Integer))))
+    if criteria.category is not None:
+        conditions.append(book.c.category == criteria.category.value)
+    if criteria.published_from is not None:
+        conditions.append(book.c.publication_date >= criteria.published_from)
+    if criteria.published_to is not None:
+        conditions.append(book.c.publication_date <= criteria.published_to)
+
+    # lock the books first so no rating or review can be added to them halfway through
+    locked = await session.execute(
+        select(book.c.id).where(*conditions).with_for_update()
+    )
+    book_ids = locked.scalars().all()
+    if not book_ids:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='No books match')
+
+    # one array parameter instead of thousands of IN (...) parameters
+    ids = bindparam('book_ids', book_ids, type_=ARRAY(Integer))
+
+    # orders point at cart lines, those lines (and so the books) have to stay
+    ordered = await session.execute(
+        select(shopping_cart.c.book_id).distinct().
+        join(order, order.c.shopping_cart_id == shopping_cart.c.id).
+        where(shopping_cart.c.book_id == any_(ids)).
+        order_by(shopping_cart.c.book_id).
+        limit(ORDERED_REPORT_LIMIT)
+    )
+    ordered_ids = ordered.scalars().all()
+    if ordered_ids:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f'Books with orders cannot be deleted: {ordered_ids}'
+        )
+
+    await stock.release_carts(session, shopping_cart.c.book_id == any_(ids))
+    removed = {}
+    for table in (books_in_ages, rate, book_rating_stats, review, images, shopping_cart, wishlist):
+        result = await session.execute(delete(table).where(table.c.book_id == any_(ids)))
+        removed[table.name] = result.rowcount
+
+    result = await session.execute(delete(book).where(book.c.id == any_(ids)))
+    removed[book.name] = result.rowcount
+    await session.commit()
+    catalog.remove(*book_ids)
+
+    return {"message": "Books deleted successfully", "removed": removed}
+
 
 @BOOK_router.post('/upload-image')
 async def upload_image(
@@ -276,6 +562,7 @@ async def upload_image(
     )
     await session.execute(query)
     await session.commit()
+    await catalog.refresh_book(session, book_id)
 
     return {"message": "Image uploaded successfully"}
 
@@ -311,6 +598,7 @@ async def delete_image(
     delete_query = delete(images).where(images.c.book_id == book_id)
     await session.execute(delete_query)
     await session.commit()
+    await catalog.refresh_book(session, book_id)
 
     return {"message": "Images deleted successfully"}
 
@@ -342,23 +630,10 @@ async def increment_quantity(
     if not is_admin and not is_superuser:
         raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    # Check if the book exists
-    book_query = await session.execute(
-        select(book).where(book.c.id == book_id)
-    )
-    book_data = book_query.scalar()
-
-    if not book_data:
-        raise HTTPException(status_code=404, detail="Book not found")
-
-    # Increment the book quantity
-    update_query = (
-        update(book).
-        where(book.c.id == book_id).
-        values(quantity=book.c.quantity + increment_by)
-    )
-    await session.execute(update_query)
+    # Increment the book quantity, 404 when the book doesn't exist
+    quantities = await stock.restock(session, {book_id: increment_by})
     await session.commit()
+    catalog.set_quantity(book_id, quantities[book_id])
 
     return {"message": "Book quantity incremented successfully"}
 
@@ -390,30 +665,119 @@ async def decrement_quantity(
     if not is_admin and not is_superuser:
         raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    # Check if the book exists
-    book_query = await session.execute(
-        select(book.c.id, book.c.quantity).where(book.c.id == book_id))
+    # Only unreserved copies can be taken out, checked in the same UPDATE
+    quantities = await stock.withdraw(session, {book_id: decrement_by})
+    await session.commit()
+    catalog.set_quantity(book_id, quantities[book_id])
 
-    book_data = book_query.fetchone()
+    return {"message": "Book quantity decremented successfully"}
 
-    if not book_data:
-        raise HTTPException(status_code=404, detail="Book not found")
 
-    # Check if the resulting quantity will be non-negative
-    new_quantity = book_data.quantity - decrement_by
-    if new_quantity < 0:
-        raise HTTPException(status_code=400, detail="There is not enough books")
+INVENTORY_BATCH_LIMIT = 10000
+
+
+@BOOK_router.patch('/inventory/batch')
+async def adjust_inventory(
+        adjustments: List[InventoryAdjustment],
+        session: AsyncSession = Depends(get_async_session),
+        token: dict = Depends(verify_token)
+):
+    if token is None:
+        raise HTTPException(status_code=403, detail='Forbidden')
+
+    user_id = token.get('user_id')
 
-    # Decrement the book quantity
-    update_query = (
-        update(book).
-        where(book.c.id == book_id).
-        values(quantity=new_quantity)
+    # admin or superuser, in one query
+    staff_query = await session.execute(
+        select(user.c.id).select_from(
+            user.outerjoin(superuser, superuser.c.user_id == user.c.id)
+        ).where(
+            (user.c.id == user_id) &
+            ((user.c.is_admin == True) | (superuser.c.is_superuser == True))
+        )
     )
-    await session.execute(update_query)
-    await session.commit()
+    if not staff_query.first():
+        raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    return {"message": "Book quantity decremented successfully"}
+    if len(adjustments) > INVENTORY_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f'At most {INVENTORY_BATCH_LIMIT} adjustments per batch')
+
+    # barcodes to ids first, so an id and the barcode of the same book count as duplicates
+    barcodes = list({item.barcode for item in adjustments if item.barcode is not None})
+    barcode_books = {}
+    if barcodes:
+        found = await session.execute(
+            select(book.c.barcode, book.c.id).
+            where(book.c.barcode == any_(bindparam('barcodes', barcodes, type_=ARRAY(String))))
+        )
+        for barcode, book_id in found.fetchall():
+            barcode_books.setdefault(barcode, []).append(book_id)
+
+    results = [None] * len(adjustments)
+    rows = []
+    first_index = {}
+    for index, item in enumerate(adjustments):
+        book_id = item.book_id
+        if item.barcode is not None:
+            matches = barcode_books.get(item.barcode, [])
+            if len(matches) != 1:
+                detail = 'Book not found' if not matches else 'Barcode matches more than one book'
+                results[index] = {"index": index, "status": "error", "detail": detail}
+                continue
+            book_id = matches[0]
+        if book_id in first_index:
+            results[index] = {
+                "index": index,
+                "status": "error",
+                "detail": f'Duplicate entry for this book, already adjusted by entry {first_index[book_id]}'
+            }
+            continue
+        first_index[book_id] = index
+        rows.append((index, book_id, item.delta, item.quantity))
+
+    if rows:
+        entries = values(
+            column('idx', Integer),
+            column('book_id', Integer),
+            column('delta', Integer),
+            column('quantity', Integer),
+            name='entries'
+        ).data(rows)
+
+        # None goes into VALUES as a bare NULL, a column of only NULLs would be typed text
+        delta = cast(entries.c.delta, Integer)
+        quantity = cast(entries.c.quantity, Integer)
+        new_quantity = case(
+            (quantity.is_not(None), quantity),
+            else_=book.c.quantity + delta
+        )
+        # copies held by shopping carts can't be adjusted away
+        updated = await session.execute(
+            update(book).
+            where((book.c.id == entries.c.book_id) & (new_quantity >= book.c.reserved)).
+            values(quantity=new_quantity).
+            returning(entries.c.idx, book.c.id, book.c.quantity)
+        )
+        quantities = {}
+        for row in updated.fetchall():
+            quantities[row.id] = row.quantity
+            results[row.idx] = {"index": row.idx, "status": "ok", "book_id": row.id, "quantity": row.quantity}
+
+        # tell "no such book" apart from "would go below reserved stock" for the entries that were not applied
+        missing = [(index, book_id) for index, book_id, _, _ in rows if results[index] is None]
+        if missing:
+            found = await session.execute(
+                select(book.c.id).where(book.c.id.in_([book_id for _, book_id in missing]))
+            )
+            found = set(found.scalars().all())
+            for index, book_id in missing:
+                detail = 'Quantity cannot go below reserved stock' if book_id in found else 'Book not found'
+                results[index] = {"index": index, "status": "error", "detail": detail}
+
+        await session.commit()
+        catalog.set_quantities(quantities)
+
+    return results
 
 
 @BOOK_router.get('/download-image/')
@@ -0,0 +1,50 @@
+"""
+Shopping cart lines hold stock (books.reserved) until they are removed. Lines
+added more than CART_RESERVATION_HOURS ago are deleted here and their stock
+released, so abandoned carts don't keep books unavailable. Run it from cron:
+
+    python -m books.cart_expiry [hours]
+
+Lines an order points to are left alone.
+"""
+import asyncio
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, delete, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from books.stock import release_carts
+from config import CART_RESERVATION_HOURS
+from database import async_session_maker, engine
+from models.model import shopping_cart, order
+
+
+async def expire_carts(session: AsyncSession, older_than: datetime) -> int:
+    # lock the stale lines, a cart changed meanwhile would release the wrong count;
+    # lines locked by a running request are left for the next run
+    result = await session.execute(
+        select(shopping_cart.c.id).where(
+            shopping_cart.c.created_at < older_than,
+            ~exists().where(order.c.shopping_cart_id == shopping_cart.c.id)
+        ).with_for_update(skip_locked=True)
+    )
+    cart_ids = result.scalars().all()
+    if not cart_ids:
+        return 0
+
+    await release_carts(session, shopping_cart.c.id.in_(cart_ids))
+    await session.execute(delete(shopping_cart).where(shopping_cart.c.id.in_(cart_ids)))
+    return len(cart_ids)
+
+
+async def main(hours: float):
+    async with async_session_maker() as session:
+        expired = await expire_carts(session, datetime.utcnow() - timedelta(hours=hours))
+        await session.commit()
+    await engine.dispose()
+    print(f'{expired} cart lines older than {hours:g} hours expired')
+
+
+if __name__ == '__main__':
+    asyncio.run(main(float(sys.argv[1]) if len(sys.argv) > 1 else CART_RESERVATION_HOURS))
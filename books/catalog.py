@@ -0,0 +1,172 @@
+import asyncio
+import secrets
+
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from books.queries import hydrated_books_query
+from models.model import book
+
+
+class BookRecord:
+    __slots__ = (
+        'id', 'special_book_id', 'title', 'author', 'publication_date', 'quantity', 'description',
+        'price', 'barcode', 'language', 'category', 'added_at', 'average_rating', 'rating_count', 'ages', 'photos'
+    )
+
+    def __init__(self, row, ages, photos):
+        self.id = row.id
+        self.special_book_id = row.special_book_id
+        self.title = row.title
+        self.author = row.author
+        self.publication_date = row.publication_date
+        self.quantity = row.quantity
+        self.description = row.description
+        self.price = row.price
+        self.barcode = row.barcode
+        self.language = row.language
+        self.category = row.category
+        self.added_at = row.added_at
+        self.average_rating = row.average_rating
+        self.rating_count = row.rating_count
+        self.ages = ages
+        self.photos = photos
+
+    def to_dict(self, fields=None):
+        book_dict = {
+            "id": self.id,
+            "special_book_id": self.special_book_id,
+            "title": self.title,
+            "author": self.author,
+            "publication_date": self.publication_date,
+            "quantity": self.quantity,
+            "description": self.description,
+            "price": self.price,
+            "barcode": self.barcode,
+            "language": self.language,
+            "ages": self.ages,
+            "category": self.category,
+            "average_rating": self.average_rating if self.average_rating is not None else 0,
+            "added_at": self.added_at.strftime('%Y-%m-%d %H:%M:%S') if self.added_at else None,
+            "photos": self.photos
+        }
+        if fields is None:
+            return book_dict
+        book_dict["cover"] = self.photos[0] if self.photos else None
+        return {name: value for name, value in book_dict.items() if name in fields}
+
+
+async def _load_records(session: AsyncSession, book_ids=None):
+    query = hydrated_books_query(with_rating_count=True).order_by(book.c.id)
+    if book_ids is not None:
+        query = query.where(book.c.id.in_(book_ids))
+
+    books_list = (await session.execute(query)).fetchall()
+    return [BookRecord(b, b.ages or [], b.photos or []) for b in books_list]
+
+
+class CatalogSnapshot:
+    """
+    In-process copy of the whole catalog used by the public read endpoints.
+
+    Loaded lazily on the first read; the book admin endpoints and create_rate
+    patch it after they commit. Every change bumps `version`, which is what
+    the ETag of catalog-backed responses is built from.
+
+    Derived in-memory structures subscribe to it and get `rebuild(books)`
+    after every load, `upsert(record)` / `remove(book_id)` on single changes.
+    """
+
+    def __init__(self):
+        self.books = {}
+        self.version = 0
+        self.loaded = False
+        self._loading = False
+        self._stale = False
+        self._epoch = secrets.token_hex(4)
+        self._lock = asyncio.Lock()
+        self._listeners = []
+
+    def subscribe(self, listener):
+        self._listeners.append(listener)
+        if self.loaded:
+            listener.rebuild(self.books)
+
+    async def get_books(self, session: AsyncSession):
+        if not self.loaded:
+            async with self._lock:
+                if not self.loaded:
+                    await self._load(session)
+        return self.books
+
+    async def _load(self, session: AsyncSession):
+        self._loading = True
+        self._stale = False
+        try:
+            records = await _load_records(session)
+        finally:
+            self._loading = False
+        self.books = {record.id: record for record in records}
+        self.version += 1
+        for listener in self._listeners:
+            listener.rebuild(self.books)
+        # a write landed while we were reading, serve this copy once and reload next time
+        self.loaded = not self._stale
+
+    def _changed(self):
+        self.version += 1
+        if self._loading:
+            self._stale = True
+
+    def invalidate(self):
+        self.loaded = False
+        self._changed()
+
+    async def refresh_book(self, session: AsyncSession, *book_ids: int):
+        if not self.loaded:
+            self._changed()
+            return
+        records = {record.id: record for record in await _load_records(session, book_ids)}
+        for book_id in book_ids:
+            record = records.get(book_id)
+            if record is not None:
+                self.books[book_id] = record
+                for listener in self._listeners:
+                    listener.upsert(record)
+            else:
+                self.books.pop(book_id, None)
+                for listener in self._listeners:
+                    listener.remove(book_id)
+        self._changed()
+
+    def remove(self, *book_ids: int):
+        for book_id in book_ids:
+            if self.books.pop(book_id, None) is not None:
+                for listener in self._listeners:
+                    listener.remove(book_id)
+        self._changed()
+
+    def set_quantity(self, book_id: int, quantity: int):
+        record = self.books.get(book_id)
+        if record is not None:
+            record.quantity = quantity
+        self._changed()
+
+    def set_quantities(self, quantities: dict):
+        for book_id, quantity in quantities.items():
+            record = self.books.get(book_id)
+            if record is not None:
+                record.quantity = quantity
+        self._changed()
+
+    def etag(self):
+        return f'W/"catalog-{self._epoch}-{self.version}"'
+
+    def not_modified(self, request: Request):
+        return request.headers.get('if-none-match') == self.etag()
+
+    def not_modified_response(self):
+        return Response(status_code=304, headers={'ETag': self.etag()})
+
+
+catalog = CatalogSnapshot()
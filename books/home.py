@@ -0,0 +1,164 @@
+"""
+The /home payload, built from the catalog snapshot and kept as bytes.
+
+A background task rebuilds it every HOME_REFRESH_INTERVAL seconds when the
+catalog version moved (quantity changes only bump the version) and shortly
+after book writes, which reach it as a catalog listener. Requests only copy
+the bytes out.
+"""
+import asyncio
+import heapq
+import time
+from datetime import date, datetime
+from itertools import islice
+
+from books.catalog import catalog
+from config import HOME_REFRESH_INTERVAL
+from database import async_session_maker
+from utilities import dumps
+
+# writes usually come in bursts (an admin adding photos one by one), wait for the rest before rebuilding
+HOME_REFRESH_DELAY = 0.5
+
+
+def home_payload(books):
+    # Top-rated books, in id order like before
+    top_rated_books = islice(
+        (b for b in books.values() if b.average_rating is not None and b.average_rating >= 4),
+        5
+    )
+    top_rated_books_list = [
+        {
+            "book_id": b.id,
+            "title": b.title,
+            "author": b.author,
+            "publication_date": b.publication_date,
+            "category": b.category,
+            "description": b.description,
+            "price": b.price,
+            "quantity": b.quantity,
+            "language": b.language,
+            "average_rating": b.average_rating,
+            "photos": b.photos
+        }
+        for b in top_rated_books
+    ]
+
+    # Latest books by publication date, books without a date first (postgres DESC puts NULLs first)
+    latest_books = heapq.nlargest(
+        3,
+        books.values(),
+        key=lambda b: (b.publication_date is None, b.publication_date or date.min)
+    )
+    latest_books_list = [
+        {
+            "id": b.id,
+            "special_book_id": b.special_book_id,
+            "title": b.title,
+            "author": b.author,
+            "publication_date": b.publication_date,
+            "quantity": b.quantity,
+            "description": b.description,
+            "price": b.price,
+            "barcode": b.barcode,
+            "language": b.language,
+            "category": b.category,
+            "average_rating": b.average_rating if b.average_rating is not None else 0,
+            "photos": b.photos
+        }
+        for b in latest_books
+    ]
+
+    return {
+        'Top Rated Books': top_rated_books_list,
+        'Latest Books': latest_books_list
+    }
+
+
+class HomePage:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self.body = None
+        self.etag = None
+        self.version = None
+        self.built_at = None
+        self.refreshes = 0
+        self.failures = 0
+        self.last_error = None
+        self.last_duration = 0
+        self._built = 0
+        self._wake = asyncio.Event()
+        self._task = None
+
+    def build(self, books):
+        started = time.perf_counter()
+        self.body = dumps(home_payload(books))
+        self.etag = catalog.etag()
+        self.version = catalog.version
+        self.built_at = datetime.utcnow()
+        self._built = time.monotonic()
+        self.refreshes += 1
+        self.last_duration = time.perf_counter() - started
+
+    async def get(self, session):
+        # first request, or the catalog was invalidated (bulk import): don't serve the old payload
+        if self.body is None or not catalog.loaded:
+            self.build(await catalog.get_books(session))
+        return self.body
+
+    def rebuild(self, books):
+        self.build(books)
+
+    def upsert(self, record):
+        self._wake.set()
+
+    def remove(self, book_id: int):
+        self._wake.set()
+
+    async def _refresh(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+                await asyncio.sleep(HOME_REFRESH_DELAY)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self.version == catalog.version and catalog.loaded:
+                continue
+            try:
+                async with async_session_maker() as session:
+                    self.build(await catalog.get_books(session))
+            except Exception as e:
+                # keep serving the previous payload, try again next round
+                self.failures += 1
+                self.last_error = repr(e)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._refresh())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "built_at": self.built_at,
+            "age_seconds": round(time.monotonic() - self._built, 3) if self.body is not None else None,
+            "built_version": self.version,
+            "catalog_version": catalog.version,
+            "versions_behind": catalog.version - self.version if self.version is not None else None,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "last_build_ms": round(self.last_duration * 1000, 3),
+            "refresh_interval": self.interval
+        }
+
+
+home_page = HomePage(HOME_REFRESH_INTERVAL)
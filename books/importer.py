@@ -0,0 +1,192 @@
+import csv
+import io
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import Table, MetaData, Column, Integer, String, Float, Date, select, insert, update, exists, \
+    and_, or_, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from books.scheme import BookImportRow, ImportFormatEnum
+from models.model import book, books_in_ages, categories
+
+IMPORT_BATCH_SIZE = 5000
+
+# lives only for the import transaction, so it is kept out of the alembic metadata
+staging_metadata = MetaData()
+
+books_import_staging = Table(
+    'books_import_staging',
+    staging_metadata,
+    Column('row_number', Integer, primary_key=True),
+    Column('special_book_id', Integer),
+    Column('title', String),
+    Column('author', String),
+    Column('publication_date', Date),
+    Column('quantity', Integer),
+    Column('age', String),
+    Column('category', String),
+    Column('description', String),
+    Column('price', Float),
+    Column('language', String),
+    Column('barcode', String),
+    Column('error', String),
+    prefixes=['TEMPORARY'],
+    postgresql_on_commit='DROP'
+)
+
+STAGING_COLUMNS = [
+    'row_number', 'special_book_id', 'title', 'author', 'publication_date', 'quantity',
+    'age', 'category', 'description', 'price', 'language', 'barcode'
+]
+
+
+def _read_rows(file, import_format: ImportFormatEnum):
+    text_file = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    if import_format == ImportFormatEnum.csv:
+        # header is line 1, so data rows are numbered from 2 like in a spreadsheet
+        yield from enumerate(csv.DictReader(text_file), start=2)
+        return
+
+    for row_number, line in enumerate(text_file, start=1):
+        if not line.strip():
+            continue
+        try:
+            yield row_number, orjson.loads(line)
+        except orjson.JSONDecodeError:
+            yield row_number, None
+
+
+async def _copy_batch(session: AsyncSession, batch):
+    connection = await session.connection()
+    raw_connection = await connection.get_raw_connection()
+    await raw_connection.driver_connection.copy_records_to_table(
+        books_import_staging.name, records=batch, columns=STAGING_COLUMNS
+    )
+
+
+def _flag(condition, message):
+    return update(books_import_staging).where(
+        books_import_staging.c.error.is_(None),
+        condition
+    ).values(error=message)
+
+
+async def import_books(session: AsyncSession, file, import_format: ImportFormatEnum):
+    """
+    Load a CSV / NDJSON supplier feed into books and books_in_ages.
+
+    Rows are validated while the file is read and COPYed into a temporary
+    staging table in batches; duplicates are then detected for the whole
+    feed at once and the valid rows merged with two INSERT ... SELECT.
+    The caller commits.
+    """
+    staging = books_import_staging
+    await session.run_sync(lambda sync_session: staging.create(sync_session.connection()))
+
+    errors = []
+    batch = []
+    for row_number, raw in _read_rows(file, import_format):
+        if not isinstance(raw, dict):
+            errors.append({"row": row_number, "errors": ['Row is not a valid JSON object']})
+            continue
+        try:
+            row = BookImportRow.model_validate(raw)
+        except ValidationError as e:
+            errors.append({
+                "row": row_number,
+                "errors": [f"{'.'.join(str(loc) for loc in error['loc'])}: {error['msg']}" for error in e.errors()]
+            })
+            continue
+
+        batch.append((
+            row_number, row.special_book_id, row.title, row.author, row.publication_date, row.quantity,
+            row.age.value, row.category.value, row.description, row.price, row.language.value, row.barcode
+        ))
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await _copy_batch(session, batch)
+            batch = []
+
+    if batch:
+        await _copy_batch(session, batch)
+
+    # temp tables are never auto-analyzed
+    await session.execute(text(f'ANALYZE {staging.name}'))
+
+    # duplicates of books already in the catalog
+    await session.execute(_flag(
+        exists().where(and_(book.c.title == staging.c.title, book.c.author == staging.c.author)),
+        'Book with this TITLE and AUTHOR already exists'
+    ))
+    await session.execute(_flag(
+        exists().where(or_(book.c.special_book_id == staging.c.special_book_id, book.c.barcode == staging.c.barcode)),
+        'Book with this SPECIAL_BOOK_ID or BARCODE already exists'
+    ))
+
+    # duplicates inside the feed, the first occurrence wins
+    earlier = staging.alias('earlier')
+    await session.execute(_flag(
+        exists().where(and_(
+            earlier.c.row_number < staging.c.row_number,
+            earlier.c.error.is_(None),
+            earlier.c.title == staging.c.title,
+            earlier.c.author == staging.c.author
+        )),
+        'Duplicate TITLE and AUTHOR in this file'
+    ))
+    await session.execute(_flag(
+        exists().where(and_(
+            earlier.c.row_number < staging.c.row_number,
+            earlier.c.error.is_(None),
+            or_(earlier.c.special_book_id == staging.c.special_book_id, earlier.c.barcode == staging.c.barcode)
+        )),
+        'Duplicate SPECIAL_BOOK_ID or BARCODE in this file'
+    ))
+
+    valid = staging.c.error.is_(None)
+
+    await session.execute(insert(categories).from_select(
+        ['category_name'],
+        select(staging.c.category).distinct().where(
+            valid,
+            ~exists().where(categories.c.category_name == staging.c.category)
+        )
+    ))
+
+    inserted = await session.execute(insert(book).from_select(
+        ['special_book_id', 'title', 'author', 'publication_date', 'category', 'description',
+         'price', 'quantity', 'barcode', 'language', 'added_at'],
+        select(
+            staging.c.special_book_id,
+            staging.c.title,
+            staging.c.author,
+            staging.c.publication_date,
+            staging.c.category,
+            staging.c.description,
+            staging.c.price,
+            staging.c.quantity,
+            staging.c.barcode,
+            staging.c.language,
+            func.timezone('utc', func.now())
+        ).where(valid).order_by(staging.c.row_number)
+    ))
+
+    # barcodes are unique among the accepted rows, so they link the new books back to their age group
+    await session.execute(insert(books_in_ages).from_select(
+        ['ages', 'book_id'],
+        select(staging.c.age, book.c.id).select_from(
+            staging.join(book, book.c.barcode == staging.c.barcode)
+        ).where(valid)
+    ))
+
+    rejected = await session.execute(
+        select(staging.c.row_number, staging.c.error).where(staging.c.error.is_not(None))
+    )
+    errors.extend({"row": r.row_number, "errors": [r.error]} for r in rejected.fetchall())
+    errors.sort(key=lambda error: error["row"])
+
+    return {
+        "imported": inserted.rowcount,
+        "failed": len(errors),
+        "errors": errors
+    }
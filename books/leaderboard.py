@@ -0,0 +1,193 @@
+"""
+Top rated and trending books, overall and per category.
+
+Both rankings are sorted lists of (-score, book_id) that create_rate (and
+delete_user, for the ratings it removes) updates in place, so reading the
+top N is a slice.
+
+* top rated is the Bayesian average (C * m + sum) / (C + count), with m the
+  mean of all ratings taken when the leaderboards are loaded and C =
+  LEADERBOARD_PRIOR_WEIGHT. m stays fixed between loads so a new rating
+  only moves the book it belongs to.
+* trending is the sum of exp(lambda * (rated_at - epoch)) over a book's
+  ratings. Decaying every score by the same factor doesn't change the
+  order, so instead of shrinking old ratings new ones are made heavier
+  relative to a fixed epoch (the load time), lambda = ln 2 / half-life.
+"""
+import asyncio
+import math
+from bisect import bisect_left, insort
+from datetime import datetime
+
+from sqlalchemy import select, func, literal
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from books.catalog import catalog
+from config import LEADERBOARD_PRIOR_WEIGHT, TRENDING_HALF_LIFE_DAYS
+from models.model import rate
+
+TOP_RATED = 'top_rated'
+TRENDING = 'trending'
+
+# postgres raises on exp() underflow instead of returning 0
+_MIN_EXPONENT = -700
+
+
+class Ranking:
+    def __init__(self):
+        self._entries = []
+        self._scores = {}
+
+    def set(self, book_id: int, score: float):
+        self.discard(book_id)
+        self._scores[book_id] = score
+        insort(self._entries, (-score, book_id))
+
+    def discard(self, book_id: int):
+        score = self._scores.pop(book_id, None)
+        if score is not None:
+            position = bisect_left(self._entries, (-score, book_id))
+            del self._entries[position]
+
+    def top(self, limit: int):
+        return [(book_id, -score) for score, book_id in self._entries[:limit]]
+
+
+class Leaderboards:
+    def __init__(self, prior_weight: float, half_life_days: float):
+        self.prior_weight = prior_weight
+        self.decay = math.log(2) / (half_life_days * 86400)
+        self.prior_mean = 0
+        self.epoch = datetime.utcnow()
+        self.loaded = False
+        self._loading = False
+        self._stale = False
+        self._lock = asyncio.Lock()
+        self._stats = {}
+        self._categories = {}
+        self._rankings = {}
+
+    def _trend(self, rated_at):
+        if rated_at is None:
+            return 0
+        return math.exp(max(self.decay * (rated_at - self.epoch).total_seconds(), _MIN_EXPONENT))
+
+    def _score(self, kind: str, stats):
+        count, total, trend = stats
+        if kind == TOP_RATED:
+            return (self.prior_weight * self.prior_mean + total) / (self.prior_weight + count)
+        return trend
+
+    def _place(self, book_id: int):
+        stats = self._stats[book_id]
+        for category in (None, self._categories.get(book_id)):
+            for kind in (TOP_RATED, TRENDING):
+                self._rankings.setdefault((kind, category), Ranking()).set(book_id, self._score(kind, stats))
+
+    def _unplace(self, book_id: int):
+        for category in (None, self._categories.get(book_id)):
+            for kind in (TOP_RATED, TRENDING):
+                ranking = self._rankings.get((kind, category))
+                if ranking is not None:
+                    ranking.discard(book_id)
+
+    async def ensure(self, session: AsyncSession):
+        if not self.loaded:
+            async with self._lock:
+                if not self.loaded:
+                    await self._load(session)
+
+    async def _load(self, session: AsyncSession):
+        books = await catalog.get_books(session)
+        self._loading = True
+        self._stale = False
+        epoch = datetime.utcnow()
+        exponent = self.decay * func.extract('epoch', rate.c.created_at - literal(epoch))
+        try:
+            result = await session.execute(
+                select(
+                    rate.c.book_id,
+                    func.count(),
+                    func.sum(rate.c.rating),
+                    func.coalesce(func.sum(func.exp(func.greatest(exponent, _MIN_EXPONENT))), 0)
+                ).group_by(rate.c.book_id)
+            )
+            rows = result.fetchall()
+        finally:
+            self._loading = False
+
+        self.epoch = epoch
+        self._stats = {
+            book_id: [count, total, float(trend)]
+            for book_id, count, total, trend in rows
+            if book_id in books
+        }
+        ratings = sum(stats[0] for stats in self._stats.values())
+        self.prior_mean = sum(stats[1] for stats in self._stats.values()) / ratings if ratings else 0
+        self._categories = {book_id: record.category for book_id, record in books.items()}
+        self._rankings = {}
+        for book_id in self._stats:
+            self._place(book_id)
+        # a rating landed while we were reading, it may be missing: load again next time
+        self.loaded = not self._stale
+
+    def record_rating(self, book_id: int, rating: int, rated_at: datetime):
+        if not self.loaded:
+            if self._loading:
+                self._stale = True
+            return
+        stats = self._stats.setdefault(book_id, [0, 0, 0.0])
+        stats[0] += 1
+        stats[1] += rating
+        stats[2] += self._trend(rated_at)
+        self._place(book_id)
+
+    def forget_ratings(self, ratings):
+        """Take deleted rates, as (book_id, rating, rated_at), back out of the scores."""
+        if not self.loaded:
+            if self._loading:
+                self._stale = True
+            return
+        changed = set()
+        for book_id, rating, rated_at in ratings:
+            stats = self._stats.get(book_id)
+            if stats is None:
+                continue
+            stats[0] -= 1
+            stats[1] -= rating or 0
+            stats[2] -= self._trend(rated_at)
+            changed.add(book_id)
+        for book_id in changed:
+            if self._stats[book_id][0] > 0:
+                self._place(book_id)
+            else:
+                self._unplace(book_id)
+                del self._stats[book_id]
+
+    def top(self, kind: str, category, limit: int):
+        ranking = self._rankings.get((kind, category))
+        return ranking.top(limit) if ranking is not None else []
+
+    # catalog listener: keeps the per category rankings in line with the books
+
+    def rebuild(self, books):
+        # books may have been added or removed wholesale (bulk import), load again on the next read
+        self.loaded = False
+
+    def upsert(self, record):
+        if self._categories.get(record.id) == record.category:
+            return
+        if record.id in self._stats:
+            self._unplace(record.id)
+            self._categories[record.id] = record.category
+            self._place(record.id)
+        else:
+            self._categories[record.id] = record.category
+
+    def remove(self, book_id: int):
+        self._unplace(book_id)
+        self._stats.pop(book_id, None)
+        self._categories.pop(book_id, None)
+
+
+leaderboards = Leaderboards(LEADERBOARD_PRIOR_WEIGHT, TRENDING_HALF_LIFE_DAYS)
@@ -0,0 +1,112 @@
+"""
+Barcode / special_book_id -> book for the in-store scanners.
+
+Both codes are kept in dicts next to the catalog snapshot, so a lookup is
+two hash probes and the price and stock come from the snapshot record
+(quantity changes patch that record in place). Codes that aren't in the
+index are looked up in the database once, a book added by another worker
+gets pulled into the snapshot that way.
+"""
+from sqlalchemy import select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from books.catalog import catalog
+from models.model import book
+
+
+class CodeIndex:
+    """
+    barcode and special_book_id -> ids of the books carrying them.
+
+    Neither column is unique, when a code is shared the lowest book id wins.
+    """
+
+    def __init__(self):
+        self._barcodes = {}
+        self._special_ids = {}
+        self._codes = {}
+
+    @staticmethod
+    def _add(codes: dict, code, book_id: int):
+        if code is not None:
+            codes.setdefault(code, set()).add(book_id)
+
+    @staticmethod
+    def _discard(codes: dict, code, book_id: int):
+        book_ids = codes.get(code)
+        if book_ids is not None:
+            book_ids.discard(book_id)
+            if not book_ids:
+                del codes[code]
+
+    def rebuild(self, books):
+        self._barcodes = {}
+        self._special_ids = {}
+        self._codes = {}
+        for record in books.values():
+            self.upsert(record)
+
+    def upsert(self, record):
+        self.remove(record.id)
+        self._add(self._barcodes, record.barcode, record.id)
+        self._add(self._special_ids, record.special_book_id, record.id)
+        self._codes[record.id] = (record.barcode, record.special_book_id)
+
+    def remove(self, book_id: int):
+        codes = self._codes.pop(book_id, None)
+        if codes is not None:
+            barcode, special_book_id = codes
+            self._discard(self._barcodes, barcode, book_id)
+            self._discard(self._special_ids, special_book_id, book_id)
+
+    def by_barcode(self, barcode: str):
+        book_ids = self._barcodes.get(barcode)
+        return min(book_ids) if book_ids else None
+
+    def by_special_id(self, special_book_id: int):
+        book_ids = self._special_ids.get(special_book_id)
+        return min(book_ids) if book_ids else None
+
+
+code_index = CodeIndex()
+
+
+def _lookup_result(record):
+    return {
+        "id": record.id,
+        "special_book_id": record.special_book_id,
+        "barcode": record.barcode,
+        "title": record.title,
+        "author": record.author,
+        "price": record.price,
+        "quantity": record.quantity
+    }
+
+
+async def lookup_books(session: AsyncSession, barcodes: list, special_book_ids: list):
+    """
+    Returns ({barcode: result or None}, {special_book_id: result or None}).
+    """
+    books = await catalog.get_books(session)
+
+    missing_barcodes = [code for code in barcodes if code_index.by_barcode(code) is None]
+    missing_special_ids = [code for code in special_book_ids if code_index.by_special_id(code) is None]
+    if missing_barcodes or missing_special_ids:
+        result = await session.execute(
+            select(book.c.id).where(or_(
+                book.c.barcode.in_(missing_barcodes),
+                book.c.special_book_id.in_(missing_special_ids)
+            ))
+        )
+        missing_ids = [book_id for book_id in result.scalars().all() if book_id not in books]
+        if missing_ids:
+            await catalog.refresh_book(session, *missing_ids)
+
+    def resolve(book_id):
+        record = books.get(book_id) if book_id is not None else None
+        return _lookup_result(record) if record is not None else None
+
+    return (
+        {code: resolve(code_index.by_barcode(code)) for code in barcodes},
+        {code: resolve(code_index.by_special_id(code)) for code in special_book_ids},
+    )
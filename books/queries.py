@@ -0,0 +1,122 @@
+from functools import reduce
+
+from fastapi import HTTPException
+from sqlalchemy import select, func, literal_column
+from sqlalchemy.dialects.postgresql import array_agg, aggregate_order_by
+
+from models.model import book, book_rating_stats, images, books_in_ages, SEARCH_CONFIGS
+
+
+BOOK_COLUMNS = (
+    book.c.id,
+    book.c.special_book_id,
+    book.c.title,
+    book.c.author,
+    book.c.publication_date,
+    book.c.quantity,
+    book.c.description,
+    book.c.price,
+    book.c.barcode,
+    book.c.language,
+    book.c.category,
+    book.c.added_at,
+)
+
+# every field a book list can return, in response order; `cover` (first photo) only on request
+BOOK_FIELDS = (
+    'id', 'special_book_id', 'title', 'author', 'publication_date', 'quantity', 'description', 'price',
+    'barcode', 'language', 'ages', 'category', 'average_rating', 'added_at', 'photos', 'cover'
+)
+DEFAULT_BOOK_FIELDS = BOOK_FIELDS[:-1]
+
+
+def parse_fields(fields):
+    if fields is None:
+        return None
+    requested = {name.strip() for name in fields.split(',') if name.strip()}
+    unknown = requested.difference(BOOK_FIELDS)
+    if unknown or not requested:
+        raise HTTPException(status_code=400, detail=f'Unknown fields: {", ".join(sorted(unknown))}')
+    return requested
+
+
+_BOOK_FIELD_FORMATS = {
+    "ages": lambda value: value or [],
+    "photos": lambda value: value or [],
+    "average_rating": lambda value: value if value is not None else 0,
+    "added_at": lambda value: value.strftime('%Y-%m-%d %H:%M:%S') if value else None,
+}
+
+
+def book_row_to_dict(b, fields=None):
+    row = b._mapping
+    names = DEFAULT_BOOK_FIELDS if fields is None else [name for name in BOOK_FIELDS if name in fields]
+    return {
+        name: _BOOK_FIELD_FORMATS[name](row[name]) if name in _BOOK_FIELD_FORMATS else row[name]
+        for name in names
+    }
+
+
+def book_rating():
+    # only valid in queries built by hydrated_books_query, which joins book_rating_stats
+    return func.round(book_rating_stats.c.average_rating, 1)
+
+
+def book_rating_count():
+    return func.coalesce(book_rating_stats.c.rating_count, 0)
+
+
+def book_photos():
+    return select(
+        array_agg(aggregate_order_by(images.c.photo_url, images.c.id))
+    ).where(images.c.book_id == book.c.id).scalar_subquery()
+
+
+def book_ages():
+    return select(
+        array_agg(aggregate_order_by(books_in_ages.c.ages, books_in_ages.c.id))
+    ).where(books_in_ages.c.book_id == book.c.id).scalar_subquery()
+
+
+def book_cover():
+    return select(
+        images.c.photo_url
+    ).where(images.c.book_id == book.c.id).order_by(images.c.id).limit(1).scalar_subquery()
+
+
+def hydrated_books_query(average_rating=None, fields=None, with_rating_count=False):
+    """
+    Books with their average rating, photos and age groups in one statement.
+
+    Ratings come from book_rating_stats (left joined, postgres drops the
+    join when no rating column is selected). photos / ages come back as
+    arrays (None when the book has none), callers
+    add their own filtering, ordering and limit. With `fields` only those
+    columns (plus id) are selected and the unused subqueries are left out.
+    """
+    def wanted(name):
+        return name in fields if fields is not None else name != 'cover'
+
+    columns = [column for column in BOOK_COLUMNS if column.name == 'id' or wanted(column.name)]
+    if wanted('average_rating'):
+        columns.append((average_rating if average_rating is not None else book_rating()).label('average_rating'))
+    if wanted('photos'):
+        columns.append(book_photos().label('photos'))
+    if wanted('ages'):
+        columns.append(book_ages().label('ages'))
+    if wanted('cover'):
+        columns.append(book_cover().label('cover'))
+    if with_rating_count:
+        columns.append(book_rating_count().label('rating_count'))
+
+    return select(*columns).select_from(
+        book.outerjoin(book_rating_stats, book_rating_stats.c.book_id == book.c.id)
+    )
+
+
+def search_tsquery(text):
+    # matches when the query matches under any of the configurations books.search_vector is built with
+    return reduce(
+        lambda left, right: left.op('||')(right),
+        [func.websearch_to_tsquery(literal_column(f"'{config}'"), text) for config in SEARCH_CONFIGS]
+    )
@@ -0,0 +1,114 @@
+"""
+Recomputes every book's star histogram from rates in one pass with NumPy
+and compares it with book_rating_stats.
+
+    python -m books.rating_histograms          # report drift only
+    python -m books.rating_histograms --fix    # and rewrite the drifted books
+
+rates is streamed in chunks of (book_id, rating); each chunk is folded into
+a (max book id + 1) x 5 counter matrix with one np.bincount over
+book_id * 5 + rating - 1. Count, sum and average follow from the histogram,
+so --fix rewrites whole rows.
+"""
+import asyncio
+import sys
+from decimal import Decimal
+
+import numpy as np
+from sqlalchemy import select, delete, func, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from books.rating_stats import STARS, HISTOGRAM_COLUMNS
+from database import async_session_maker, engine
+from models.model import book, rate, book_rating_stats
+
+CHUNK_SIZE = 100_000
+# drifted book ids printed in the report
+REPORT_LIMIT = 20
+
+
+async def compute_histograms(session: AsyncSession) -> np.ndarray:
+    max_id = (await session.execute(select(func.max(book.c.id)))).scalar() or 0
+    size = (max_id + 1) * len(STARS)
+    counts = np.zeros(size, dtype=np.int64)
+
+    result = await session.stream(
+        select(rate.c.book_id, rate.c.rating).where(
+            rate.c.book_id.isnot(None),
+            rate.c.book_id <= max_id,
+            rate.c.rating.between(STARS.start, STARS.stop - 1)
+        ).execution_options(yield_per=CHUNK_SIZE)
+    )
+    async for chunk in result.partitions(CHUNK_SIZE):
+        pairs = np.array(chunk, dtype=np.int64)
+        counts += np.bincount(pairs[:, 0] * len(STARS) + pairs[:, 1] - STARS.start, minlength=size)
+    return counts.reshape(max_id + 1, len(STARS))
+
+
+async def stored_histograms(session: AsyncSession, shape) -> np.ndarray:
+    stored = np.zeros(shape, dtype=np.int64)
+    result = await session.execute(
+        select(book_rating_stats.c.book_id, *(book_rating_stats.c[name] for name in HISTOGRAM_COLUMNS)).
+        where(book_rating_stats.c.book_id < shape[0])
+    )
+    rows = np.array(result.fetchall(), dtype=np.int64).reshape(-1, len(STARS) + 1)
+    stored[rows[:, 0]] = rows[:, 1:]
+    return stored
+
+
+async def fix_histograms(session: AsyncSession, book_ids, histograms):
+    counts = histograms.sum(axis=1)
+    sums = histograms @ np.array(STARS)
+    rows = [
+        {
+            'book_id': int(book_id),
+            'rating_count': int(count),
+            'rating_sum': int(total),
+            'average_rating': Decimal(int(total)) / int(count) if count else 0,
+            **{name: int(stars) for name, stars in zip(HISTOGRAM_COLUMNS, histogram)}
+        }
+        for book_id, histogram, count, total in zip(book_ids, histograms, counts, sums)
+    ]
+    rated = [row for row in rows if row['rating_count']]
+    unrated = [row['book_id'] for row in rows if not row['rating_count']]
+
+    if rated:
+        stmt = pg_insert(book_rating_stats)
+        columns = ['rating_count', 'rating_sum', 'average_rating', *HISTOGRAM_COLUMNS]
+        await session.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[book_rating_stats.c.book_id],
+                set_={name: stmt.excluded[name] for name in columns}
+            ),
+            rated
+        )
+    if unrated:
+        await session.execute(delete(book_rating_stats).where(book_rating_stats.c.book_id.in_(unrated)))
+
+
+async def main(fix: bool):
+    async with async_session_maker() as session:
+        if fix:
+            # no new ratings until the fixed rows are committed
+            await session.execute(text('LOCK TABLE rates IN SHARE MODE'))
+        else:
+            await session.connection(execution_options={'isolation_level': 'REPEATABLE READ'})
+
+        computed = await compute_histograms(session)
+        stored = await stored_histograms(session, computed.shape)
+        drifted = np.flatnonzero((computed != stored).any(axis=1))
+
+        print(f'{len(computed) - 1} book ids checked, {int(computed.sum())} ratings, {len(drifted)} drifted')
+        for book_id in drifted[:REPORT_LIMIT]:
+            print(f'  book {book_id}: stored {stored[book_id].tolist()} computed {computed[book_id].tolist()}')
+
+        if fix and len(drifted):
+            await fix_histograms(session, drifted, computed[drifted])
+            await session.commit()
+            print(f'fixed {len(drifted)} books')
+    await engine.dispose()
+
+
+if __name__ == '__main__':
+    asyncio.run(main('--fix' in sys.argv[1:]))
@@ -0,0 +1,101 @@
+"""
+book_rating_stats: rating count, sum, average and star histogram per book.
+
+Every statement that adds or removes rates updates the table in the same
+transaction, reads join it instead of aggregating rates. To fill it for
+existing data, or to put it right after rates were changed by hand:
+
+    python -m books.rating_stats
+"""
+import asyncio
+
+from sqlalchemy import select, delete, insert, update, func, cast, text, DECIMAL
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_session_maker, engine
+from models.model import rate, book_rating_stats
+
+STARS = range(1, 6)
+HISTOGRAM_COLUMNS = [f'rating_{stars}' for stars in STARS]
+
+
+async def add_rating(session: AsyncSession, book_id: int, rating: int):
+    stmt = pg_insert(book_rating_stats).values(
+        book_id=book_id,
+        rating_count=1,
+        rating_sum=rating,
+        average_rating=rating,
+        **{f'rating_{rating}': 1}
+    )
+    # in ON CONFLICT ... SET the table's columns are still the old values
+    rating_sum = book_rating_stats.c.rating_sum + stmt.excluded.rating_sum
+    rating_count = book_rating_stats.c.rating_count + 1
+    await session.execute(stmt.on_conflict_do_update(
+        index_elements=[book_rating_stats.c.book_id],
+        set_={
+            'rating_count': rating_count,
+            'rating_sum': rating_sum,
+            'average_rating': cast(rating_sum, DECIMAL) / rating_count,
+            f'rating_{rating}': book_rating_stats.c[f'rating_{rating}'] + 1
+        }
+    ))
+
+
+async def remove_ratings(session: AsyncSession, condition):
+    """Take the rates matching `condition` out of the stats, call it before deleting them."""
+    removed = select(
+        rate.c.book_id,
+        func.count().label('rating_count'),
+        func.coalesce(func.sum(rate.c.rating), 0).label('rating_sum'),
+        *(func.count().filter(rate.c.rating == stars).label(f'rating_{stars}') for stars in STARS)
+    ).where(condition).group_by(rate.c.book_id).subquery()
+
+    rating_count = book_rating_stats.c.rating_count - removed.c.rating_count
+    rating_sum = book_rating_stats.c.rating_sum - removed.c.rating_sum
+    await session.execute(
+        update(book_rating_stats).
+        where(book_rating_stats.c.book_id == removed.c.book_id).
+        values(
+            rating_count=rating_count,
+            rating_sum=rating_sum,
+            # average_rating is NOT NULL, books left without ratings get 0 until the DELETE below
+            average_rating=func.coalesce(cast(rating_sum, DECIMAL) / func.nullif(rating_count, 0), 0),
+            **{
+                f'rating_{stars}': book_rating_stats.c[f'rating_{stars}'] - removed.c[f'rating_{stars}']
+                for stars in STARS
+            }
+        )
+    )
+    await session.execute(delete(book_rating_stats).where(book_rating_stats.c.rating_count <= 0))
+
+
+async def rebuild_rating_stats(session: AsyncSession):
+    # SHARE blocks new ratings until we commit, so nothing is counted twice or missed
+    await session.execute(text('LOCK TABLE rates IN SHARE MODE'))
+    await session.execute(delete(book_rating_stats))
+    result = await session.execute(
+        insert(book_rating_stats).from_select(
+            ['book_id', 'rating_count', 'rating_sum', 'average_rating', *HISTOGRAM_COLUMNS],
+            select(
+                rate.c.book_id,
+                func.count(),
+                func.coalesce(func.sum(rate.c.rating), 0),
+                func.coalesce(func.avg(rate.c.rating), 0),
+                *(func.count().filter(rate.c.rating == stars) for stars in STARS)
+            ).where(rate.c.book_id.isnot(None)).group_by(rate.c.book_id)
+        )
+    )
+    return result.rowcount
+
+
+async def main():
+    async with async_session_maker() as session:
+        books = await rebuild_rating_stats(session)
+        await session.commit()
+    await engine.dispose()
+    print(f'rating stats rebuilt for {books} books')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""
+books.review_count: number of reviews per book.
+
+Kept in the same transaction as the statements that add or delete reviews.
+To fill it for existing data:
+
+    python -m books.review_counts
+"""
+import asyncio
+
+from sqlalchemy import select, update, func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import async_session_maker, engine
+from models.model import book, review
+
+
+async def count_review(session: AsyncSession, book_id: int):
+    """Returns False when the book doesn't exist."""
+    result = await session.execute(
+        update(book).
+        where(book.c.id == book_id).
+        values(review_count=book.c.review_count + 1).
+        returning(book.c.id)
+    )
+    return result.scalar() is not None
+
+
+async def uncount_reviews(session: AsyncSession, condition):
+    """Take the reviews matching `condition` out of the counts, call it before deleting them."""
+    removed = select(
+        review.c.book_id,
+        func.count().label('review_count')
+    ).where(condition).group_by(review.c.book_id).subquery()
+
+    await session.execute(
+        update(book).
+        where(book.c.id == removed.c.book_id).
+        values(review_count=func.greatest(book.c.review_count - removed.c.review_count, 0))
+    )
+
+
+async def rebuild_review_counts(session: AsyncSession):
+    await session.execute(text('LOCK TABLE reviews IN SHARE MODE'))
+    counts = select(func.count()).where(review.c.book_id == book.c.id).scalar_subquery()
+    result = await session.execute(
+        update(book).
+        where(book.c.review_count != counts).
+        values(review_count=counts)
+    )
+    return result.rowcount
+
+
+async def main():
+    async with async_session_maker() as session:
+        books = await rebuild_review_counts(session)
+        await session.commit()
+    await engine.dispose()
+    print(f'review counts corrected for {books} books')
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
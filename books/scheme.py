@@ -2,7 +2,10 @@ import datetime
 import enum
 from typing import Optional, List
 
-from pydantic import BaseModel
+from dateutil.parser import parse
+from pydantic import BaseModel, Field, field_validator, model_validator
+
+from category.scheme import AgesEnum, CategoryEnum
 
 class BookCategoryEnum(enum.Enum):
     fiction = "Fiction"
@@ -20,6 +23,94 @@ class BookLanguageEnum(enum.Enum):
     french = "French"
     uzbek = "Uzbek"
 
+class BookSortEnum(enum.Enum):
+    id = "id"
+    newest = "newest"
+    price_asc = "price_asc"
+    price_desc = "price_desc"
+    rating = "rating"
+
+
+class ExportFormatEnum(enum.Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+class ImportFormatEnum(enum.Enum):
+    csv = "csv"
+    ndjson = "ndjson"
+
+
+class BookImportRow(BaseModel):
+    special_book_id: int
+    title: str
+    author: str
+    publication_date: datetime.date
+    quantity: int
+    age: AgesEnum
+    category: CategoryEnum
+    description: str = 'description is not available'
+    price: float
+    language: BookLanguageEnum
+    barcode: str
+
+    @field_validator('publication_date', mode='before')
+    def parse_publication_date(cls, v):
+        if isinstance(v, str):
+            try:
+                return parse(v).date()
+            except (ValueError, OverflowError):
+                raise ValueError('Invalid publication date format')
+        return v
+
+    @field_validator('barcode')
+    def validate_barcode(cls, v):
+        if len(v) < 8 or len(v) > 13:
+            raise ValueError('Barcode should be between 8 and 13 digits')
+        return v
+
+
+class InventoryAdjustment(BaseModel):
+    book_id: Optional[int] = None
+    barcode: Optional[str] = None
+    delta: Optional[int] = None
+    quantity: Optional[int] = None
+
+    @model_validator(mode='after')
+    def check_target_and_change(self):
+        if (self.book_id is None) == (self.barcode is None):
+            raise ValueError('Provide exactly one of book_id or barcode')
+        if (self.delta is None) == (self.quantity is None):
+            raise ValueError('Provide exactly one of delta or quantity')
+        if self.quantity is not None and self.quantity < 0:
+            raise ValueError('Quantity cannot be negative')
+        return self
+
+
+class BulkDeleteBooks(BaseModel):
+    book_ids: Optional[List[int]] = None
+    category: Optional[CategoryEnum] = None
+    published_from: Optional[datetime.date] = None
+    published_to: Optional[datetime.date] = None
+
+    @model_validator(mode='after')
+    def check_filter(self):
+        if not self.book_ids and self.category is None and self.published_from is None and self.published_to is None:
+            raise ValueError('Provide book_ids or at least one filter')
+        return self
+
+
+class BookLookupBatch(BaseModel):
+    barcodes: List[str] = Field(default_factory=list, max_length=500)
+    special_book_ids: List[int] = Field(default_factory=list, max_length=500)
+
+    @model_validator(mode='after')
+    def check_codes(self):
+        if not self.barcodes and not self.special_book_ids:
+            raise ValueError('Provide barcodes or special_book_ids')
+        return self
+
+
 class BooksList(BaseModel):
     id: int
     special_book_id: int
@@ -0,0 +1,115 @@
+"""
+Stock changes as single conditional UPDATE ... FROM (VALUES ...) statements.
+
+books.quantity is the stock on hand, books.reserved the part of it held by
+shopping carts. Every function takes {book_id: count} for any number of
+books and is all or nothing: when one of the books can't be changed an
+HTTPException is raised before anything is committed, and the caller's
+session is rolled back when it closes.
+
+Whatever deletes shopping_cart lines calls release_carts first, so reserved
+stays the sum of the carts' quantities.
+"""
+from fastapi import HTTPException
+from sqlalchemy import select, update, values, column, func, true, Integer
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models.model import book, shopping_cart
+
+
+def _entries(items: dict):
+    return values(
+        column('book_id', Integer),
+        column('count', Integer),
+        name='entries'
+    ).data(list(items.items()))
+
+
+async def _apply(session: AsyncSession, items: dict, entries, condition, detail: str, status_code=400, **changes):
+    if not items:
+        return {}
+    if any(count < 1 for count in items.values()):
+        raise HTTPException(status_code=400, detail='Quantity must be positive')
+
+    result = await session.execute(
+        update(book).
+        where((book.c.id == entries.c.book_id) & condition).
+        values(**changes).
+        returning(book.c.id, book.c.quantity)
+    )
+    changed = {row.id: row.quantity for row in result.fetchall()}
+    if len(changed) != len(items):
+        raise HTTPException(status_code=status_code, detail=detail)
+    return changed
+
+
+async def reserve(session: AsyncSession, items: dict):
+    """Hold stock for carts, only where enough unreserved copies are left."""
+    entries = _entries(items)
+    return await _apply(
+        session, items, entries,
+        book.c.quantity - book.c.reserved >= entries.c.count,
+        'Not enough books available',
+        reserved=book.c.reserved + entries.c.count
+    )
+
+
+async def release(session: AsyncSession, items: dict):
+    """Give held stock back, e.g. when a cart line is reduced or removed."""
+    entries = _entries(items)
+    return await _apply(
+        session, items, entries,
+        true(),
+        'Book not found',
+        status_code=404,
+        # never below zero, should reserved have been edited by hand
+        reserved=func.greatest(book.c.reserved - entries.c.count, 0)
+    )
+
+
+async def commit(session: AsyncSession, items: dict):
+    """Turn held stock into a sale: it leaves both reserved and quantity."""
+    entries = _entries(items)
+    return await _apply(
+        session, items, entries,
+        book.c.reserved >= entries.c.count,
+        'Not enough reserved books',
+        reserved=book.c.reserved - entries.c.count,
+        quantity=book.c.quantity - entries.c.count
+    )
+
+
+async def release_carts(session: AsyncSession, condition):
+    """Give back what the shopping_cart lines matching `condition` hold, call it before deleting them."""
+    held = select(
+        shopping_cart.c.book_id,
+        func.sum(shopping_cart.c.quantity).label('count')
+    ).where(condition, shopping_cart.c.quantity > 0).group_by(shopping_cart.c.book_id).subquery()
+
+    await session.execute(
+        update(book).
+        where(book.c.id == held.c.book_id).
+        values(reserved=func.greatest(book.c.reserved - held.c.count, 0))
+    )
+
+
+async def restock(session: AsyncSession, items: dict):
+    entries = _entries(items)
+    return await _apply(
+        session, items, entries,
+        true(),
+        'Book not found',
+        status_code=404,
+        quantity=book.c.quantity + entries.c.count
+    )
+
+
+async def withdraw(session: AsyncSession, items: dict):
+    """Remove unreserved stock on hand."""
+    entries = _entries(items)
+    return await _apply(
+        session, items, entries,
+        book.c.quantity - book.c.reserved >= entries.c.count,
+        'There is not enough books',
+        quantity=book.c.quantity - entries.c.count
+    )
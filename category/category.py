@@ -1,12 +1,13 @@
 from typing import List
 
-from fastapi import FastAPI, APIRouter,HTTPException, Depends,status
+from fastapi import FastAPI, APIRouter,HTTPException, Depends,status, Request
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy import select, update,insert, and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from utilities import generate_token, verify_token
+from utilities import generate_token, verify_token, FastJSONResponse
 from database import get_async_session
 from models.model import *
+from books.catalog import catalog
 
 from category.scheme import *
 
@@ -135,14 +136,32 @@ async def get_age_category(
 async def get_categories(
         session: AsyncSession = Depends(get_async_session),
 ):
-    all_category = await session.execute(select(categories))
-    return all_category.fetchall()
+    all_category = await session.execute(select(categories.c.id, categories.c.category_name))
+    return FastJSONResponse([dict(row._mapping) for row in all_category.fetchall()])
 
 
 @category_router.get('/books_in category',response_model=List[Books_in_category])
 async def get_books_in_category(
         category_enum: CategoryEnum,
+        request: Request,
         session: AsyncSession = Depends(get_async_session),
 ):
-    books_in_category = await session.execute(select(book).where(book.c.category == category_enum.value).order_by(book.c.id))
-    return books_in_category.fetchall()
\ No newline at end of file
+    books = await catalog.get_books(session)
+    if catalog.not_modified(request):
+        return catalog.not_modified_response()
+
+    return FastJSONResponse([
+        {
+            "id": b.id,
+            "title": b.title,
+            "author": b.author,
+            "publication_date": b.publication_date,
+            "category": b.category,
+            "description": b.description,
+            "price": b.price,
+            "quantity": b.quantity,
+            "language": b.language,
+        }
+        for b in books.values()
+        if b.category == category_enum.value
+    ], headers={'ETag': catalog.etag()})
\ No newline at end of file
@@ -10,3 +10,19 @@ DB_HOST = os.environ.get('DB_HOST')
 DB_PORT = os.environ.get('DB_PORT')
 SECRET = os.environ.get('SECRET')
 
+# default /search-books backend: substring, fulltext, fuzzy or index
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'substring')
+
+# /search-books result cache (fulltext and fuzzy mode): max entries and seconds an entry lives
+SEARCH_CACHE_SIZE = int(os.environ.get('SEARCH_CACHE_SIZE', 1000))
+SEARCH_CACHE_TTL = float(os.environ.get('SEARCH_CACHE_TTL', 300))
+
+# seconds between background rebuilds of the /home payload (writes also trigger one)
+HOME_REFRESH_INTERVAL = float(os.environ.get('HOME_REFRESH_INTERVAL', 30))
+
+# leaderboards: weight of the overall mean in the Bayesian average (in ratings), half-life of trending
+LEADERBOARD_PRIOR_WEIGHT = float(os.environ.get('LEADERBOARD_PRIOR_WEIGHT', 10))
+TRENDING_HALF_LIFE_DAYS = float(os.environ.get('TRENDING_HALF_LIFE_DAYS', 7))
+
+# hours a shopping cart line holds its stock before python -m books.cart_expiry releases it
+CART_RESERVATION_HOURS = float(os.environ.get('CART_RESERVATION_HOURS', 72))
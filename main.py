@@ -1,152 +1,76 @@
-from datetime import datetime
-from typing import List
+import csv
+import io
+from datetime import datetime, date, timedelta
+from typing import List, Optional
 
-from dateutil.parser import parse
-
-from sqlalchemy import update, select, func, desc, and_, insert, delete
+from sqlalchemy import update, select, func, and_, insert, delete, tuple_, true, values, column, Integer, Float
 from starlette import status
-from fastapi import FastAPI, APIRouter, Depends, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Request, Response, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import or_
 from starlette.middleware.cors import CORSMiddleware
 from starlette.staticfiles import StaticFiles
 
 from models.model import review
-from utilities import verify_token
-from database import get_async_session
+from utilities import verify_token, FastJSONResponse, render, encode_cursor, decode_cursor
+from database import get_async_session, async_session_maker
 from models.model import *
 from scheme import *
 
 from auth.auth import register_router
 from category.category import category_router
 from books.books import BOOK_router
+from books.catalog import catalog
+from books import stock
+from books.lookup import code_index
+from books.home import home_page
+from books.leaderboard import leaderboards
+from books.rating_stats import add_rating, STARS, HISTOGRAM_COLUMNS
+from books.review_counts import count_review
+from books.queries import parse_fields, search_tsquery, book_cover
+from search.index import search_index
+from search.suggest import suggest_index
+from search.facets import facet_index
+from search.cache import search_cache, normalize_query
+from config import SEARCH_BACKEND
 from superuser import role_router
 
 
-app = FastAPI(title='Book Shop')
+app = FastAPI(title='Book Shop', default_response_class=FastJSONResponse)
 router = APIRouter()
 
 
 @router.get('/home')
 async def home(
+        request: Request,
         session: AsyncSession = Depends(get_async_session)
 ):
-    # Query to get the top-rated books
-    top_rated_query = (
-        select(
-            book.c.id,
-            book.c.title,
-            book.c.author,
-            book.c.publication_date,
-            book.c.category,
-            book.c.description,
-            book.c.price,
-            book.c.quantity,
-            book.c.language,
-            func.round(func.avg(rate.c.rating), 1).label('average_rating')
-        ).join(
-            rate, rate.c.book_id == book.c.id, isouter=True
-        ).group_by(
-            book.c.id
-        ).order_by(
-            book.c.id
-        ).having(
-            func.round(func.avg(rate.c.rating), 1) >= 4
-        ).limit(5)  # Adjust the limit as needed
-    )
+    # pre-serialized by the background refresher, see books/home.py
+    body = await home_page.get(session)
+    if request.headers.get('if-none-match') == home_page.etag:
+        return Response(status_code=304, headers={'ETag': home_page.etag})
+    return Response(content=body, media_type='application/json', headers={'ETag': home_page.etag})
 
-    top_rated_result = await session.execute(top_rated_query)
-    top_rated_books = top_rated_result.fetchall()
 
-    # Fetch photos for each top-rated book
-    top_rated_book_ids = [b.id for b in top_rated_books]
-    top_rated_photo_query = select(images).where(images.c.book_id.in_(top_rated_book_ids))
-    top_rated_photo_result = await session.execute(top_rated_photo_query)
-    top_rated_photos_by_book_id = {book_id: [] for book_id in top_rated_book_ids}
-
-    for photo in top_rated_photo_result.fetchall():
-        top_rated_photos_by_book_id[photo.book_id].append(photo.photo_url)
-
-    # Convert the top-rated result to a list of dictionaries with photos included
-    top_rated_books_list = [
-        {
-            "book_id": b.id,
-            "title": b.title,
-            "author": b.author,
-            "publication_date": b.publication_date,
-            "category": b.category,
-            "description": b.description,
-            "price": b.price,
-            "quantity": b.quantity,
-            "language": b.language,
-            "average_rating": b.average_rating if b.average_rating is not None else 0,
-            "photos": top_rated_photos_by_book_id.get(b.id, [])  # Get photos for this book
-        }
-        for b in top_rated_books
-    ]
+@router.get('/home/stats')
+async def home_stats(
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_async_session)
+):
+    if token is None:
+        raise HTTPException(status_code=403, detail='Forbidden')
 
-    # Query to get the latest books
-    latest_books_query = (
-        select(
-            book.c.id,
-            book.c.special_book_id,
-            book.c.title,
-            book.c.author,
-            book.c.publication_date,
-            book.c.quantity,
-            book.c.description,
-            book.c.price,
-            book.c.barcode,
-            book.c.language,
-            book.c.category,
-            func.coalesce(func.round(func.avg(rate.c.rating), 1), 0).label('average_rating')
-        ).join(
-            rate, rate.c.book_id == book.c.id, isouter=True
-        ).join(
-            review, review.c.book_id == book.c.id, isouter=True
-        ).group_by(
-            book.c.id
-        ).order_by(
-            desc(book.c.publication_date)
-        ).limit(3)
+    result = await session.execute(
+        select(user.c.id).where(
+            (user.c.id == token.get('user_id')) &
+            (user.c.is_admin == True)
+        )
     )
+    if not result.scalar():
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
 
-    latest_books_result = await session.execute(latest_books_query)
-    latest_books = latest_books_result.fetchall()
-
-    # Fetch photos for each latest book
-    latest_book_ids = [b.id for b in latest_books]
-    latest_photo_query = select(images).where(images.c.book_id.in_(latest_book_ids))
-    latest_photo_result = await session.execute(latest_photo_query)
-    latest_photos_by_book_id = {book_id: [] for book_id in latest_book_ids}
-
-    for photo in latest_photo_result.fetchall():
-        latest_photos_by_book_id[photo.book_id].append(photo.photo_url)
-
-    # Convert the latest result to a list of dictionaries with photos included
-    latest_books_list = [
-        {
-            "id": b.id,
-            "special_book_id": b.special_book_id,
-            "title": b.title,
-            "author": b.author,
-            "publication_date": b.publication_date,
-            "quantity": b.quantity,
-            "description": b.description,
-            "price": b.price,
-            "barcode": b.barcode,
-            "language": b.language,
-            "category": b.category,
-            "average_rating": b.average_rating if b.average_rating is not None else 1,
-            "photos": latest_photos_by_book_id.get(b.id, [])  # Get photos for this book
-        }
-        for b in latest_books
-    ]
-
-    return {
-        'Top Rated Books': top_rated_books_list,
-        'Latest Books': latest_books_list
-    }
+    return home_page.stats()
 
 
 @router.post('/add-comment')
@@ -166,10 +90,8 @@ async def add_review(
     if not result.scalar():
         raise HTTPException(status_code=404, detail='User not found')
 
-    book_result = await session.execute(
-        select(book).where(book.c.id == book_id)
-    )
-    if not book_result.scalar():
+    # bumps books.review_count and tells us whether the book exists
+    if not await count_review(session, book_id):
         raise HTTPException(status_code=404, detail='Book not found')
 
     insert_query = review.insert().values(
@@ -184,30 +106,81 @@ async def add_review(
     return {'message': 'Review added successfully'}
 
 
+REVIEWS_PAGE_SIZE = 20
+
+
 @router.get('/get-comments')
 async def get_reviews(
         book_id: int,
+        limit: int = Query(REVIEWS_PAGE_SIZE, ge=1, le=100),
+        cursor: Optional[str] = Query(None, description='next_cursor of the previous page'),
         session: AsyncSession = Depends(get_async_session)
 ):
-    book_result = await session.execute(
-        select(book).where(book.c.id == book_id)
+    last_date = last_id = None
+    if cursor is not None:
+        values = decode_cursor(cursor)
+        try:
+            last_date = datetime.fromisoformat(values[0]) if values[0] is not None else None
+            last_id = int(values[1])
+        except (ValueError, TypeError, IndexError):
+            raise HTTPException(status_code=400, detail='Invalid cursor')
+
+    # newest first from ix_reviews_book_id_review_date, reviews without a date come last ordered
+    # by id. The dated and the undated reviews are read by separate queries, each one range of
+    # the index; the undated ones only when the dated ran out. One extra row tells us whether
+    # there is a next page.
+    columns = (review.c.id, review.c.user_id, review.c.comments, review.c.review_date)
+    in_nulls = last_id is not None and last_date is None
+    if in_nulls:
+        page = select(*columns).where(
+            review.c.book_id == book.c.id, review.c.review_date.is_(None), review.c.id < last_id
+        ).order_by(review.c.id.desc())
+    else:
+        conditions = [review.c.book_id == book.c.id, review.c.review_date.is_not(None)]
+        if last_id is not None:
+            conditions.append(tuple_(review.c.review_date, review.c.id) < tuple_(last_date, last_id))
+        page = select(*columns).where(*conditions).order_by(
+            review.c.review_date.desc().nulls_last(), review.c.id.desc()
+        )
+    page = page.limit(limit + 1).lateral('page')
+
+    # the book row comes back even without reviews, no row at all means there is no such book
+    result = await session.execute(
+        select(book.c.review_count, page).select_from(
+            book.outerjoin(page, true())
+        ).where(book.c.id == book_id)
     )
-    if not book_result.scalar():
+    rows = result.fetchall()
+    if not rows:
         raise HTTPException(status_code=404, detail='Book not found')
 
-    reviews_result = await session.execute(
-        select(review).where(review.c.book_id == book_id)
-    )
+    reviews = [row for row in rows if row.id is not None]
+    if not in_nulls and len(reviews) <= limit:
+        # the undated reviews, if we get to them, are read from their start
+        result = await session.execute(
+            select(*columns).where(
+                review.c.book_id == book_id, review.c.review_date.is_(None)
+            ).order_by(review.c.id.desc()).limit(limit + 1 - len(reviews))
+        )
+        reviews = reviews + result.fetchall()
 
-    reviews = reviews_result.fetchall()
-    return [
-        {
-            "user_id": review.user_id,
-            "comments": review.comments,
-            "review_date": review.review_date
-        }
-        for review in reviews
-    ]
+    next_cursor = None
+    if len(reviews) > limit:
+        reviews = reviews[:limit]
+        next_cursor = encode_cursor(reviews[-1].review_date, reviews[-1].id)
+
+    return {
+        "reviews": [
+            {
+                "user_id": r.user_id,
+                "comments": r.comments,
+                "review_date": r.review_date
+            }
+            for r in reviews
+        ],
+        "total": rows[0].review_count,
+        "next_cursor": next_cursor
+    }
 
 
 @router.post("/book-rating")
@@ -237,47 +210,187 @@ async def create_rate(
     if rating < 1 or rating > 5:
         raise HTTPException(status_code=400, detail="Rating must be between 1 and 5")
 
-    query = insert(rate).values(user_id=user_id, book_id=book_id, rating=rating)
+    rated_at = datetime.utcnow()
+    query = insert(rate).values(user_id=user_id, book_id=book_id, rating=rating, created_at=rated_at)
     await session.execute(query)
+    await add_rating(session, book_id, rating)
     await session.commit()
+    await catalog.refresh_book(session, book_id)
+    leaderboards.record_rating(book_id, rating, rated_at)
 
     return {"message": "Rating created successfully"}
 
 
-@router.get('/get-rating')
-async def get_rating(
-        session: AsyncSession = Depends(get_async_session),
-        token: dict = Depends(verify_token)
+@router.get('/leaderboard')
+async def leaderboard(
+        kind: LeaderboardEnum = LeaderboardEnum.top_rated,
+        category: Optional[str] = None,
+        limit: int = Query(10, ge=1, le=100),
+        session: AsyncSession = Depends(get_async_session)
+):
+    await leaderboards.ensure(session)
+    books = catalog.books
+    return FastJSONResponse([
+        {
+            "book_id": book_id,
+            "title": books[book_id].title,
+            "author": books[book_id].author,
+            "category": books[book_id].category,
+            "price": books[book_id].price,
+            "average_rating": books[book_id].average_rating,
+            "rating_count": books[book_id].rating_count,
+            "photos": books[book_id].photos,
+            "score": round(score, 4)
+        }
+        for book_id, score in leaderboards.top(kind.value, category, limit)
+        if book_id in books
+    ])
+
+
+@router.get('/rating-histograms')
+async def rating_histograms(
+        book_ids: List[int] = Query(..., description='Up to 500 book ids'),
+        session: AsyncSession = Depends(get_async_session)
 ):
+    if len(book_ids) > 500:
+        raise HTTPException(status_code=400, detail='At most 500 book ids per call')
+
+    # books that exist but have no ratings yet get zeros, unknown ids are left out
+    result = await session.execute(
+        select(
+            book.c.id,
+            func.coalesce(book_rating_stats.c.rating_count, 0).label('rating_count'),
+            func.round(book_rating_stats.c.average_rating, 1).label('average_rating'),
+            *(func.coalesce(book_rating_stats.c[name], 0).label(name) for name in HISTOGRAM_COLUMNS)
+        ).select_from(
+            book.outerjoin(book_rating_stats, book_rating_stats.c.book_id == book.c.id)
+        ).where(book.c.id.in_(set(book_ids)))
+    )
+    return FastJSONResponse([
+        {
+            "book_id": row.id,
+            "rating_count": row.rating_count,
+            "average_rating": row.average_rating if row.average_rating is not None else 0,
+            "histogram": {stars: row._mapping[name] for stars, name in zip(STARS, HISTOGRAM_COLUMNS)}
+        }
+        for row in result.fetchall()
+    ])
+
+
+RATINGS_PAGE_SIZE = 100
+RATINGS_EXPORT_CHUNK_SIZE = 5000
+RATINGS_CSV_COLUMNS = ["id", "user_id", "user_name", "user_email", "book_id", "book", "rating", "rated_at"]
+
+
+def _ratings_report(book_id: Optional[int], user_id: Optional[int], rated_from: Optional[date], rated_to: Optional[date]):
+    # one statement instead of a title lookup per rating
+    query = select(
+        rate.c.id,
+        rate.c.user_id,
+        user.c.name.label('user_name'),
+        user.c.email.label('user_email'),
+        rate.c.book_id,
+        book.c.title.label('book'),
+        rate.c.rating,
+        rate.c.created_at.label('rated_at')
+    ).select_from(
+        rate.outerjoin(book, book.c.id == rate.c.book_id).outerjoin(user, user.c.id == rate.c.user_id)
+    )
+    if book_id is not None:
+        query = query.where(rate.c.book_id == book_id)
+    if user_id is not None:
+        query = query.where(rate.c.user_id == user_id)
+    if rated_from is not None:
+        query = query.where(rate.c.created_at >= rated_from)
+    if rated_to is not None:
+        query = query.where(rate.c.created_at < rated_to + timedelta(days=1))
+    return query.order_by(rate.c.id)
+
+
+async def _check_admin(session: AsyncSession, token: dict):
     if token is None:
         raise HTTPException(status_code=403, detail='Forbidden')
 
-    user_id = token.get('user_id')
-
-    is_admin_query = await session.execute(select(user).where(
-        (user.c.id == user_id) &
+    is_admin_query = await session.execute(select(user.c.id).where(
+        (user.c.id == token.get('user_id')) &
         (user.c.is_admin == True)
     ))
 
     if not is_admin_query.scalar():
         raise HTTPException(status_code=status.HTTP_405_METHOD_NOT_ALLOWED)
 
-    rating_query = await session.execute(
-        select(rate).order_by(rate.c.id))
-    ratings = rating_query.fetchall()
-
-    response = []
-    for rating in ratings:
-        book_query = await session.execute(select(book.c.title).where(book.c.id == rating.book_id))
-        book_title = book_query.scalar()
 
-        response.append({
-            "user_id": rating.user_id,
-            "book": book_title,
-            "rating": rating.rating
-        })
+@router.get('/get-rating')
+async def get_rating(
+        request: Request,
+        book_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        rated_from: Optional[date] = None,
+        rated_to: Optional[date] = None,
+        limit: int = Query(RATINGS_PAGE_SIZE, ge=1, le=1000),
+        cursor: Optional[str] = Query(None, description='next_cursor of the previous page'),
+        session: AsyncSession = Depends(get_async_session),
+        token: dict = Depends(verify_token)
+):
+    await _check_admin(session, token)
+
+    query = _ratings_report(book_id, user_id, rated_from, rated_to)
+    if cursor is not None:
+        try:
+            query = query.where(rate.c.id > int(decode_cursor(cursor)[0]))
+        except (ValueError, TypeError, IndexError):
+            raise HTTPException(status_code=400, detail='Invalid cursor')
+
+    result = await session.execute(query.limit(limit + 1))
+    ratings = result.fetchall()
+
+    next_cursor = None
+    if len(ratings) > limit:
+        ratings = ratings[:limit]
+        next_cursor = encode_cursor(ratings[-1].id)
+
+    return render(request, {
+        "ratings": [dict(rating._mapping) for rating in ratings],
+        "next_cursor": next_cursor
+    })
+
+
+async def _export_ratings(book_id, user_id, rated_from, rated_to):
+    # the request session is already closed while the response streams, so use our own
+    async with async_session_maker() as session:
+        query = _ratings_report(book_id, user_id, rated_from, rated_to).execution_options(
+            yield_per=RATINGS_EXPORT_CHUNK_SIZE
+        )
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(RATINGS_CSV_COLUMNS)
+
+        result = await session.stream(query)
+        async for chunk in result.partitions(RATINGS_EXPORT_CHUNK_SIZE):
+            writer.writerows(chunk)
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+
+
+@router.get('/get-rating/export')
+async def export_ratings(
+        book_id: Optional[int] = None,
+        user_id: Optional[int] = None,
+        rated_from: Optional[date] = None,
+        rated_to: Optional[date] = None,
+        session: AsyncSession = Depends(get_async_session),
+        token: dict = Depends(verify_token)
+):
+    await _check_admin(session, token)
 
-    return response
+    return StreamingResponse(
+        _export_ratings(book_id, user_id, rated_from, rated_to),
+        media_type='text/csv',
+        headers={'Content-Disposition': 'attachment; filename="ratings.csv"'}
+    )
 
 
 @router.post('/add-to-cart')
@@ -297,8 +410,6 @@ async def add_to_cart(
     book_record = book_result.fetchone()
     if not book_record:
         raise HTTPException(status_code=404, detail='Book not found')
-    if book_record.quantity < item.quantity:
-        raise HTTPException(status_code=400, detail='Not enough books available')
 
     cart_item_result = await session.execute(
         select(shopping_cart).where(
@@ -311,6 +422,9 @@ async def add_to_cart(
     if existing_cart_item:
         raise HTTPException(status_code=400, detail='Book is already in cart')
 
+    # holds the copies for this cart, 400 when not enough are left
+    await stock.reserve(session, {item.book_id: item.quantity})
+
     amount_query2 = book_record.price * item.quantity
 
     insert_query = shopping_cart.insert().values(
@@ -325,30 +439,59 @@ async def add_to_cart(
     return {"message": "Item added to cart successfully"}
 
 
+async def _cart_view(session: AsyncSession, user_id: int):
+    # cart lines with their book and cover in one statement
+    result = await session.execute(
+        select(
+            shopping_cart.c.id,
+            shopping_cart.c.user_id,
+            shopping_cart.c.book_id,
+            shopping_cart.c.quantity,
+            shopping_cart.c.amount,
+            book.c.title,
+            book.c.price,
+            book.c.quantity.label('stock'),
+            book_cover().label('cover')
+        ).select_from(
+            shopping_cart.outerjoin(book, book.c.id == shopping_cart.c.book_id)
+        ).where(shopping_cart.c.user_id == user_id).order_by(shopping_cart.c.id)
+    )
+
+    items = []
+    subtotal = 0
+    item_count = 0
+    for row in result.fetchall():
+        quantity = row.quantity or 0
+        line_total = round((row.price or 0) * quantity, 2)
+        subtotal += line_total
+        item_count += quantity
+        items.append({
+            "id": row.id,
+            "user_id": row.user_id,
+            "book_id": row.book_id,
+            "book_title": row.title,
+            "quantity": quantity,
+            "price of each book": row.price,
+            "price": row.amount,
+            "line_total": line_total,
+            "cover": row.cover,
+            # the book is still there and has enough copies for this line
+            "available": row.stock is not None and row.stock >= quantity
+        })
+
+    return {
+        "items": items,
+        "subtotal": round(subtotal, 2),
+        "item_count": item_count
+    }
+
+
 @router.get('/get-shopping-cart')
 async def get_shopping_cart(token: dict = Depends(verify_token), session: AsyncSession = Depends(get_async_session)):
     if token is None:
         raise HTTPException(status_code=403, detail='Forbidden')
 
-    user_id = token.get('user_id')
-
-    query = select(shopping_cart).where(shopping_cart.c.user_id == user_id)
-    book_query = await  session.execute(select(book).where(book.c.id == book.c.id))
-    book_query2 = book_query.fetchone()
-
-    result = await session.execute(query)
-    shopping_cart_items = result.fetchall()
-    result = []
-    for row in shopping_cart_items:
-        result.append({
-            "id": row.id,
-            "user_id": row.user_id,
-            "book_title": (await session.execute(select(book.c.title).where(book.c.id == row.book_id))).scalar(),
-            "quantity": row.quantity,
-            "price of each book": (await session.execute(select(book.c.price).where(book.c.id == row.book_id))).scalar(),
-            "price": row.amount
-        })
-    return result
+    return FastJSONResponse(await _cart_view(session, token.get('user_id')))
 
 
 @router.post('/shopping-cart/decrement-quantity')
@@ -387,6 +530,8 @@ async def decrement_quantity(
     if query2.quantity < quantity:
         raise HTTPException(status_code=400, detail='Not enough quantity in cart')
 
+    await stock.release(session, {query2.book_id: quantity})
+
     new_quantity = query2.quantity - quantity
     set_new_amount = book_query2.price * quantity
     new_amount = query2.amount - set_new_amount
@@ -440,6 +585,8 @@ async def increment_quantity(
     if not book_info:
         raise HTTPException(status_code=404, detail='Book not found')
 
+    await stock.reserve(session, {cart.book_id: quantity})
+
     new_quantity = cart.quantity + quantity
     new_amount = cart.amount + (book_info.price * quantity)
 
@@ -476,11 +623,14 @@ async def delete_cart(
         )
     )
 
-    cart_exists = cart_query.scalar()
+    cart = cart_query.fetchone()
 
-    if not cart_exists:
+    if not cart:
         raise HTTPException(status_code=404, detail='Cart not found')
 
+    if (cart.quantity or 0) > 0:
+        await stock.release(session, {cart.book_id: cart.quantity})
+
     delete_query = delete(shopping_cart).where(
         (shopping_cart.c.user_id == user_id) &
         (shopping_cart.c.id == cart_id)
@@ -491,67 +641,305 @@ async def delete_cart(
     return {'Cart deleted successfully'}
 
 
+CART_BATCH_LIMIT = 100
+
+
+@router.post('/shopping-cart/batch')
+async def batch_cart(
+        operations: List[CartOperation],
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_async_session)
+):
+    if token is None:
+        raise HTTPException(status_code=403, detail='Forbidden')
+    if not operations or len(operations) > CART_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f'Send between 1 and {CART_BATCH_LIMIT} operations')
+
+    user_id = token.get('user_id')
+    book_ids = {operation.book_id for operation in operations if operation.book_id is not None}
+    cart_ids = {operation.cart_id for operation in operations if operation.cart_id is not None}
+
+    # every book the operations touch with the user's cart line for it, in one query
+    result = await session.execute(
+        select(
+            book.c.id.label('book_id'),
+            book.c.price,
+            shopping_cart.c.id.label('cart_id'),
+            shopping_cart.c.quantity
+        ).select_from(
+            book.outerjoin(
+                shopping_cart,
+                (shopping_cart.c.book_id == book.c.id) & (shopping_cart.c.user_id == user_id)
+            )
+        ).where(or_(book.c.id.in_(book_ids), shopping_cart.c.id.in_(cart_ids)))
+    )
+    rows = result.fetchall()
+    prices = {row.book_id: row.price or 0 for row in rows}
+    cart_of_book = {row.book_id: row.cart_id for row in rows if row.cart_id is not None}
+    book_of_cart = {cart_id: book_id for book_id, cart_id in cart_of_book.items()}
+    initial = {row.book_id: row.quantity or 0 for row in rows if row.cart_id is not None}
+
+    # play the operations on the quantities first, nothing is written when one of them fails
+    final = dict(initial)
+    for position, operation in enumerate(operations):
+        if operation.cart_id is not None:
+            book_id = book_of_cart.get(operation.cart_id)
+            if book_id is None:
+                raise HTTPException(status_code=404, detail=f'Operation {position}: Cart not found')
+        else:
+            book_id = operation.book_id
+            if book_id not in prices:
+                raise HTTPException(status_code=404, detail=f'Operation {position}: Book not found')
+
+        if operation.action == CartActionEnum.add:
+            if book_id in final:
+                raise HTTPException(status_code=400, detail=f'Operation {position}: Book is already in cart')
+            final[book_id] = operation.quantity
+        elif book_id not in final:
+            raise HTTPException(status_code=404, detail=f'Operation {position}: Cart not found')
+        elif operation.action == CartActionEnum.increment:
+            final[book_id] += operation.quantity
+        elif operation.action == CartActionEnum.decrement:
+            if final[book_id] < operation.quantity:
+                raise HTTPException(status_code=400, detail=f'Operation {position}: Not enough quantity in cart')
+            final[book_id] -= operation.quantity
+        else:
+            del final[book_id]
+
+    changes = {book_id: final.get(book_id, 0) - initial.get(book_id, 0) for book_id in initial.keys() | final.keys()}
+    await stock.reserve(session, {book_id: change for book_id, change in changes.items() if change > 0})
+    await stock.release(session, {book_id: -change for book_id, change in changes.items() if change < 0})
+
+    added = [book_id for book_id in final if book_id not in initial]
+    if added:
+        await session.execute(insert(shopping_cart).values([
+            {
+                "user_id": user_id,
+                "book_id": book_id,
+                "quantity": final[book_id],
+                "amount": prices[book_id] * final[book_id]
+            }
+            for book_id in added
+        ]))
+
+    changed = [book_id for book_id in final if book_id in initial and changes[book_id]]
+    if changed:
+        entries = values(
+            column('cart_id', Integer),
+            column('change', Integer),
+            column('amount_change', Float),
+            name='entries'
+        ).data([(cart_of_book[book_id], changes[book_id], prices[book_id] * changes[book_id]) for book_id in changed])
+        await session.execute(
+            update(shopping_cart).
+            where(shopping_cart.c.id == entries.c.cart_id).
+            values(
+                quantity=shopping_cart.c.quantity + entries.c.change,
+                amount=shopping_cart.c.amount + entries.c.amount_change
+            )
+        )
+
+    removed = [cart_of_book[book_id] for book_id in initial if book_id not in final]
+    if removed:
+        await session.execute(delete(shopping_cart).where(shopping_cart.c.id.in_(removed)))
+
+    await session.commit()
+    return FastJSONResponse(await _cart_view(session, user_id))
+
+
 search_router = APIRouter()
 
 
+SEARCH_PAGE_SIZE = 20
+
+
+def _search_result(b):
+    return {
+        "id": b.id,
+        "special_book_id": b.special_book_id,
+        "title": b.title,
+        "author": b.author,
+        "publication_date": b.publication_date,
+        "quantity": b.quantity,
+        "description": b.description,
+        "price": b.price,
+        "barcode": b.barcode,
+        "language": b.language,
+        "category": b.category,
+        "photo_url": b.photos or []
+    }
+
+
+def _search_rows(records, fields):
+    if fields is not None:
+        return [b.to_dict(fields) for b in records]
+    return [_search_result(b) for b in records]
+
+
+async def _fulltext_search(session: AsyncSession, query: str, limit: int, cursor: Optional[str]):
+    """Ids of one page of matches, best rank first, and the next page's cursor."""
+    tsquery = search_tsquery(query)
+    rank = func.ts_rank(book.c.search_vector, tsquery)
+
+    stmt = select(book.c.id, rank.label('rank')).where(book.c.search_vector.op('@@')(tsquery))
+    if cursor is not None:
+        values = decode_cursor(cursor)
+        try:
+            stmt = stmt.where(tuple_(rank, book.c.id) < tuple_(float(values[0]), int(values[1])))
+        except (ValueError, TypeError, IndexError):
+            raise HTTPException(status_code=400, detail='Invalid cursor')
+
+    result = await session.execute(stmt.order_by(rank.desc(), book.c.id.desc()).limit(limit + 1))
+    matches = result.fetchall()
+
+    next_cursor = None
+    if len(matches) > limit:
+        matches = matches[:limit]
+        next_cursor = encode_cursor(matches[-1].rank, matches[-1].id)
+    return [match.id for match in matches], next_cursor
+
+
+async def _fuzzy_search(session: AsyncSession, query: str, threshold: float, limit: int):
+    # `%` uses the trigram GIN indexes on title/author and this (transaction local) threshold
+    await session.execute(select(func.set_config('pg_trgm.similarity_threshold', str(threshold), True)))
+    similarity = func.greatest(func.similarity(book.c.title, query), func.similarity(book.c.author, query))
+
+    stmt = select(book.c.id).where(
+        or_(book.c.title.op('%')(query), book.c.author.op('%')(query))
+    ).order_by(similarity.desc(), book.c.id).limit(limit)
+
+    result = await session.execute(stmt)
+    return result.scalars().all()
+
+
 @search_router.get('/search-books', response_model=List[BooksList])
 async def search_books(
         query: str,
+        request: Request,
+        mode: Optional[SearchModeEnum] = Query(None, description='Defaults to the SEARCH_BACKEND setting'),
+        limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=100, description='Page size for fulltext and fuzzy mode'),
+        cursor: Optional[str] = Query(None, description='X-Next-Cursor of the previous page (fulltext mode)'),
+        threshold: float = Query(0.3, ge=0, le=1, description='Minimum trigram similarity (fuzzy mode)'),
+        fields: Optional[str] = Query(None, description='Comma separated list of fields to return'),
         session: AsyncSession = Depends(get_async_session),
 ):
+    fields = parse_fields(fields)
+    if mode is None:
+        mode = SearchModeEnum(SEARCH_BACKEND)
+
+    books = await catalog.get_books(session)
+
+    # ranked by relevance, one page at a time, the next page's cursor is in X-Next-Cursor;
+    # the database finds the ids, the rows come from the snapshot
+    if mode == SearchModeEnum.fulltext:
+        cache_key = (mode, normalize_query(query), limit, cursor)
+        cached = search_cache.get(cache_key)
+        if cached is None:
+            generation = search_cache.generation
+            cached = await _fulltext_search(session, query, limit, cursor)
+            search_cache.put(cache_key, generation, cached)
+        book_ids, next_cursor = cached
+        rows = _search_rows([books[book_id] for book_id in book_ids if book_id in books], fields)
+        return render(request, rows, headers={'X-Next-Cursor': next_cursor} if next_cursor else None)
+
+    # typo tolerant, best `limit` matches by similarity
+    if mode == SearchModeEnum.fuzzy:
+        cache_key = (mode, normalize_query(query), limit, threshold)
+        book_ids = search_cache.get(cache_key)
+        if book_ids is None:
+            generation = search_cache.generation
+            book_ids = await _fuzzy_search(session, query, threshold, limit)
+            search_cache.put(cache_key, generation, book_ids)
+        return render(request, _search_rows([books[book_id] for book_id in book_ids if book_id in books], fields))
+
+    if catalog.not_modified(request):
+        return catalog.not_modified_response()
+
+    if mode == SearchModeEnum.index:
+        # word matches from the in-memory inverted index, hydrated from the snapshot
+        matches = [books[book_id] for book_id in search_index.search(query)]
+    else:
+        # same matching as the old ILIKE '%query%' on title, author and category
+        search_query = query.lower()
+        matches = [
+            b for b in books.values()
+            if search_query in (b.title or '').lower()
+            or search_query in (b.author or '').lower()
+            or search_query in (b.category or '').lower()
+        ]
+
+    if fields is not None:
+        return render(request, [b.to_dict(fields) for b in matches], headers={'ETag': catalog.etag()})
+
+    # rows are already shaped like BooksList, skip the second validation pass
+    return render(request, [_search_result(b) for b in matches], headers={'ETag': catalog.etag()})
+
+
+@search_router.get('/search-suggest')
+async def search_suggest(
+        q: str,
+        limit: int = Query(10, ge=1, le=20),
+        session: AsyncSession = Depends(get_async_session),
+):
+    # only touches the database when the catalog snapshot isn't loaded yet
+    await catalog.get_books(session)
+    return FastJSONResponse(suggest_index.suggest(q, limit))
+
+
+@search_router.get('/search-facets')
+async def search_facets(
+        request: Request,
+        q: Optional[str] = Query(None, description='Words to match, as in index mode of /search-books'),
+        category: Optional[List[str]] = Query(None),
+        language: Optional[List[str]] = Query(None),
+        age: Optional[List[str]] = Query(None),
+        price_min: Optional[float] = Query(None, ge=0),
+        price_max: Optional[float] = Query(None, ge=0),
+        limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=100),
+        offset: int = Query(0, ge=0),
+        fields: Optional[str] = Query(None, description='Comma separated list of fields to return'),
+        session: AsyncSession = Depends(get_async_session),
+):
+    fields = parse_fields(fields)
+    books = await catalog.get_books(session)
+    if catalog.not_modified(request):
+        return catalog.not_modified_response()
+
+    # one pass over the bitmap index: the page in id order, the total and the counts of every facet value
+    page, total, facets = facet_index.search(
+        {'category': category, 'language': language, 'age': age},
+        price_min=price_min,
+        price_max=price_max,
+        book_ids=search_index.search(q) if q else None,
+        offset=offset,
+        limit=limit
+    )
+    matches = [books[book_id] for book_id in page]
+    return render(request, {
+        "books": [b.to_dict(fields) for b in matches] if fields is not None else [_search_result(b) for b in matches],
+        "total": total,
+        "facets": facets
+    }, headers={'ETag': catalog.etag()})
 
-    search_query = f"%{query}%"
-
-    stmt = select(
-        book.c.id,
-        book.c.special_book_id,
-        book.c.title,
-        book.c.author,
-        book.c.publication_date,
-        book.c.quantity,
-        book.c.description,
-        book.c.price,
-        book.c.barcode,
-        book.c.language,
-        book.c.category
-    ).where(
-        or_(
-            book.c.title.ilike(search_query),
-            book.c.author.ilike(search_query),
-            book.c.category.ilike(search_query)
-        )
-    ).order_by(book.c.id)
-
-    result = await session.execute(stmt)
-    books_list = result.fetchall()
-
-    book_ids = [b.id for b in books_list]
-    photo_query = select(images).where(images.c.book_id.in_(book_ids))
-    photo_result = await session.execute(photo_query)
-    photos_by_book_id = {book_id: [] for book_id in book_ids}
 
-    for photo in photo_result.fetchall():
-        photos_by_book_id[photo.book_id].append(photo.photo_url)
+@search_router.get('/search-cache/stats')
+async def search_cache_stats(
+        token: dict = Depends(verify_token),
+        session: AsyncSession = Depends(get_async_session)
+):
+    if token is None:
+        raise HTTPException(status_code=403, detail='Forbidden')
 
-    books_list = [
-        {
-            "id": b.id,
-            "special_book_id": b.special_book_id,
-            "title": b.title,
-            "author": b.author,
-            "publication_date": b.publication_date,
-            "quantity": b.quantity,
-            "description": b.description,
-            "price": b.price,
-            "barcode": b.barcode,
-            "language": b.language,
-            "category": b.category,
-            "photo_url": photos_by_book_id.get(b.id, [])
-        }
-        for b in books_list
-    ]
+    result = await session.execute(
+        select(user.c.id).where(
+            (user.c.id == token.get('user_id')) &
+            (user.c.is_admin == True)
+        )
+    )
+    if not result.scalar():
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
 
-    return books_list
+    return search_cache.stats()
 
 
 ####### Middleware for incoming request hosts
@@ -564,8 +952,31 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # or list specific methods like ["GET", "POST"]
     allow_headers=["*"],  # or list specific headers
+    expose_headers=["X-Next-Cursor"],
 )
 
+catalog.subscribe(search_index)
+catalog.subscribe(suggest_index)
+catalog.subscribe(facet_index)
+catalog.subscribe(search_cache)
+catalog.subscribe(code_index)
+catalog.subscribe(home_page)
+catalog.subscribe(leaderboards)
+
+
+@app.on_event('startup')
+async def load_catalog():
+    # builds the snapshot and everything subscribed to it before the first request
+    async with async_session_maker() as session:
+        await catalog.get_books(session)
+    home_page.start()
+
+
+@app.on_event('shutdown')
+async def stop_home_refresher():
+    await home_page.stop()
+
+
 app.mount("/static", StaticFiles(directory="app/static/images"), name="static")
 app.include_router(search_router, tags=['Search'])
 app.include_router(register_router, prefix='/auth', tags=['auth'])
@@ -0,0 +1,48 @@
+"""books review count
+
+Revision ID: 0d7e4a2c6b91
+Revises: f6a0b8c3d259
+Create Date: 2026-10-18 13:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0d7e4a2c6b91'
+down_revision: Union[str, None] = 'f6a0b8c3d259'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('books', sa.Column('review_count', sa.Integer(), server_default='0', nullable=False))
+    op.execute('LOCK TABLE reviews IN SHARE MODE')
+    op.execute("""
+        UPDATE books SET review_count = counted.review_count
+        FROM (
+            SELECT book_id, count(*) AS review_count
+            FROM reviews
+            WHERE book_id IS NOT NULL
+            GROUP BY book_id
+        ) AS counted
+        WHERE books.id = counted.book_id
+    """)
+    # CONCURRENTLY can't run inside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_reviews_book_id_review_date', 'reviews',
+            ['book_id', sa.text('review_date DESC NULLS LAST'), sa.text('id DESC')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_reviews_book_id_review_date', table_name='reviews', postgresql_concurrently=True, if_exists=True
+        )
+    op.drop_column('books', 'review_count')
@@ -0,0 +1,35 @@
+"""rates paging indexes
+
+Revision ID: 1b5f9e3a7d40
+Revises: 0d7e4a2c6b91
+Create Date: 2026-10-18 13:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1b5f9e3a7d40'
+down_revision: Union[str, None] = '0d7e4a2c6b91'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY can't run inside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_rates_book_id_id', 'rates', ['book_id', 'id'], postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_rates_user_id_id', 'rates', ['user_id', 'id'], postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_rates_user_id_id', table_name='rates', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_rates_book_id_id', table_name='rates', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,189 @@
+"""base schema
+
+Revision ID: 1f0a6c3e8b21
+Revises:
+Create Date: 2026-10-18 11:00:00.000000
+
+The tables as they were before migrations were introduced. Databases that
+already have them (created with metadata.create_all) start from here with
+
+    alembic stamp 1f0a6c3e8b21
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '1f0a6c3e8b21'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('password', sa.String(), nullable=True),
+        sa.Column('email', sa.String(), nullable=True),
+        sa.Column('name', sa.String(), nullable=True),
+        sa.Column('phone_number', sa.String(), nullable=True),
+        sa.Column('is_admin', sa.Boolean(), nullable=True),
+        sa.Column('date_joined', sa.Date(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
+    op.create_table(
+        'books',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('special_book_id', sa.Integer(), nullable=True),
+        sa.Column('title', sa.String(), nullable=True),
+        sa.Column('author', sa.String(), nullable=True),
+        sa.Column('publication_date', sa.Date(), nullable=True),
+        sa.Column('category', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('price', sa.Float(), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=True),
+        sa.Column('language', sa.String(), nullable=True),
+        sa.Column('added_at', sa.TIMESTAMP(), nullable=True),
+        sa.Column('barcode', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_books_author'), 'books', ['author'], unique=False)
+    op.create_index(op.f('ix_books_barcode'), 'books', ['barcode'], unique=False)
+    op.create_index(op.f('ix_books_special_book_id'), 'books', ['special_book_id'], unique=False)
+    op.create_index(op.f('ix_books_title'), 'books', ['title'], unique=False)
+    op.create_table(
+        'category',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('category_name', sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_category_category_name'), 'category', ['category_name'], unique=True)
+    op.create_table(
+        'promotions',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('promotion_name', sa.String(), nullable=True),
+        sa.Column('description', sa.String(), nullable=True),
+        sa.Column('discount_percentage', sa.Float(), nullable=True),
+        sa.Column('start_date', sa.TIMESTAMP(), nullable=True),
+        sa.Column('end_date', sa.TIMESTAMP(), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_promotions_promotion_name'), 'promotions', ['promotion_name'], unique=True)
+    op.create_table(
+        'superuser',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('is_superuser', sa.Boolean(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'wishlists',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('book_id', sa.Integer(), nullable=True),
+        sa.Column('number_of_books_left', sa.Integer(), nullable=True),
+        sa.Column('date_created', sa.TIMESTAMP(), nullable=True),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'shopping_cart',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('book_id', sa.Integer(), nullable=True),
+        sa.Column('quantity', sa.Integer(), nullable=True),
+        sa.Column('amount', sa.Float(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), nullable=True),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'orders',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('shopping_cart_id', sa.Integer(), nullable=True),
+        sa.Column('order_date', sa.TIMESTAMP(), nullable=True),
+        sa.Column('address', sa.String(), nullable=True),
+        sa.Column('order_status', sa.String(), nullable=True),
+        sa.Column('total_price', sa.Float(), nullable=True),
+        sa.Column('phone_number', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['shopping_cart_id'], ['shopping_cart.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'reviews',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('book_id', sa.Integer(), nullable=True),
+        sa.Column('comments', sa.String(), nullable=True),
+        sa.Column('review_date', sa.TIMESTAMP(), nullable=True),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'images',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('book_id', sa.Integer(), nullable=True),
+        sa.Column('photo_url', sa.String(), nullable=True),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'rates',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('book_id', sa.Integer(), nullable=True),
+        sa.Column('rating', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'books_in_ages',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('ages', sa.String(), nullable=True),
+        sa.Column('book_id', sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table(
+        'user_address',
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=True),
+        sa.Column('address', sa.String(), nullable=True),
+        sa.Column('date_added', sa.TIMESTAMP(), nullable=True),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('user_address')
+    op.drop_table('books_in_ages')
+    op.drop_table('rates')
+    op.drop_table('images')
+    op.drop_table('reviews')
+    op.drop_table('orders')
+    op.drop_table('shopping_cart')
+    op.drop_table('wishlists')
+    op.drop_table('superuser')
+    op.drop_index(op.f('ix_promotions_promotion_name'), table_name='promotions')
+    op.drop_table('promotions')
+    op.drop_index(op.f('ix_category_category_name'), table_name='category')
+    op.drop_table('category')
+    op.drop_index(op.f('ix_books_title'), table_name='books')
+    op.drop_index(op.f('ix_books_special_book_id'), table_name='books')
+    op.drop_index(op.f('ix_books_barcode'), table_name='books')
+    op.drop_index(op.f('ix_books_author'), table_name='books')
+    op.drop_table('books')
+    op.drop_index(op.f('ix_users_email'), table_name='users')
+    op.drop_table('users')
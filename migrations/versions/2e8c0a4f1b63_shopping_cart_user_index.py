@@ -0,0 +1,34 @@
+"""shopping cart user index
+
+Revision ID: 2e8c0a4f1b63
+Revises: 1b5f9e3a7d40
+Create Date: 2026-10-18 13:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '2e8c0a4f1b63'
+down_revision: Union[str, None] = '1b5f9e3a7d40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY can't run inside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_shopping_cart_user_id_id', 'shopping_cart', ['user_id', 'id'],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_shopping_cart_user_id_id', table_name='shopping_cart', postgresql_concurrently=True, if_exists=True
+        )
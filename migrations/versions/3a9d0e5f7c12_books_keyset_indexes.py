@@ -0,0 +1,42 @@
+"""books keyset indexes
+
+Revision ID: 3a9d0e5f7c12
+Revises: 5c1e7a2b9d34
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3a9d0e5f7c12'
+down_revision: Union[str, None] = '5c1e7a2b9d34'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # CONCURRENTLY can't run inside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_books_price_id', 'books', ['price', 'id'], postgresql_concurrently=True, if_not_exists=True
+        )
+        # get-books sorts newest and price_desc put NULLs last
+        op.create_index(
+            'ix_books_added_at_id', 'books', [sa.text('added_at DESC NULLS LAST'), sa.text('id DESC')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_books_price_desc_id', 'books', [sa.text('price DESC NULLS LAST'), sa.text('id DESC')],
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_books_price_desc_id', table_name='books', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_books_price_id', table_name='books', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_books_added_at_id', table_name='books', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,40 @@
+"""trigram search indexes
+
+Revision ID: 5c1e7a2b9d34
+Revises: 1f0a6c3e8b21
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1e7a2b9d34'
+down_revision: Union[str, None] = '1f0a6c3e8b21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # CONCURRENTLY can't run inside the migration transaction
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_books_title_trgm', 'books', ['title'],
+            postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'},
+            postgresql_concurrently=True, if_not_exists=True
+        )
+        op.create_index(
+            'ix_books_author_trgm', 'books', ['author'],
+            postgresql_using='gin', postgresql_ops={'author': 'gin_trgm_ops'},
+            postgresql_concurrently=True, if_not_exists=True
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_books_author_trgm', table_name='books', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_books_title_trgm', table_name='books', postgresql_concurrently=True, if_exists=True)
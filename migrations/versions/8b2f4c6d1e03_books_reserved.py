@@ -0,0 +1,38 @@
+"""books reserved
+
+Revision ID: 8b2f4c6d1e03
+Revises: 3a9d0e5f7c12
+Create Date: 2026-10-18 12:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b2f4c6d1e03'
+down_revision: Union[str, None] = '3a9d0e5f7c12'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('books', sa.Column('reserved', sa.Integer(), server_default='0', nullable=False))
+    # what the carts already hold, otherwise releasing those lines would eat
+    # into reservations made after the upgrade
+    op.execute("""
+        UPDATE books SET reserved = held.quantity
+        FROM (
+            SELECT book_id, sum(quantity) AS quantity
+            FROM shopping_cart
+            WHERE book_id IS NOT NULL AND quantity > 0
+            GROUP BY book_id
+        ) AS held
+        WHERE books.id = held.book_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_column('books', 'reserved')
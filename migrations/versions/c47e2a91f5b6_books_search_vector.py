@@ -0,0 +1,40 @@
+"""books search vector
+
+Revision ID: c47e2a91f5b6
+Revises: 8b2f4c6d1e03
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c47e2a91f5b6'
+down_revision: Union[str, None] = '8b2f4c6d1e03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# models.model.SEARCH_VECTOR as of this revision
+SEARCH_VECTOR = ' || '.join(
+    f"setweight(to_tsvector('{config}', coalesce({column}, '')), '{weight}')"
+    for config in ('russian', 'english', 'simple')
+    for column, weight in (('title', 'A'), ('author', 'B'), ('category', 'C'), ('description', 'D'))
+)
+
+
+def upgrade() -> None:
+    # a stored generated column, filled for the existing rows by the table rewrite
+    op.add_column(
+        'books',
+        sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(SEARCH_VECTOR, persisted=True), nullable=True)
+    )
+    op.create_index('ix_books_search_vector', 'books', ['search_vector'], postgresql_using='gin')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_books_search_vector', table_name='books')
+    op.drop_column('books', 'search_vector')
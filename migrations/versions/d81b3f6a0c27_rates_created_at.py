@@ -0,0 +1,28 @@
+"""rates created at
+
+Revision ID: d81b3f6a0c27
+Revises: c47e2a91f5b6
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd81b3f6a0c27'
+down_revision: Union[str, None] = 'c47e2a91f5b6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # when the existing rates were given is unknown, they stay NULL and
+    # count for nothing in the trending leaderboard
+    op.add_column('rates', sa.Column('created_at', sa.TIMESTAMP(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('rates', 'created_at')
@@ -0,0 +1,43 @@
+"""book rating stats
+
+Revision ID: e2c95d4b7a18
+Revises: d81b3f6a0c27
+Create Date: 2026-10-18 12:50:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2c95d4b7a18'
+down_revision: Union[str, None] = 'd81b3f6a0c27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'book_rating_stats',
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('rating_count', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('rating_sum', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('average_rating', sa.DECIMAL(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id']),
+        sa.PrimaryKeyConstraint('book_id')
+    )
+    # what books/rating_stats.py would rebuild; rates can't change until the commit
+    op.execute('LOCK TABLE rates IN SHARE MODE')
+    op.execute("""
+        INSERT INTO book_rating_stats (book_id, rating_count, rating_sum, average_rating)
+        SELECT book_id, count(*), coalesce(sum(rating), 0), coalesce(avg(rating), 0)
+        FROM rates
+        WHERE book_id IS NOT NULL
+        GROUP BY book_id
+    """)
+
+
+def downgrade() -> None:
+    op.drop_table('book_rating_stats')
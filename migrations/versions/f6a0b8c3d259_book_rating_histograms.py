@@ -0,0 +1,45 @@
+"""book rating histograms
+
+Revision ID: f6a0b8c3d259
+Revises: e2c95d4b7a18
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6a0b8c3d259'
+down_revision: Union[str, None] = 'e2c95d4b7a18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+STARS = range(1, 6)
+
+
+def upgrade() -> None:
+    for stars in STARS:
+        op.add_column(
+            'book_rating_stats',
+            sa.Column(f'rating_{stars}', sa.Integer(), server_default='0', nullable=False)
+        )
+    op.execute('LOCK TABLE rates IN SHARE MODE')
+    counts = ', '.join(f'count(*) FILTER (WHERE rating = {stars}) AS rating_{stars}' for stars in STARS)
+    op.execute(f"""
+        UPDATE book_rating_stats SET {', '.join(f'rating_{stars} = counted.rating_{stars}' for stars in STARS)}
+        FROM (
+            SELECT book_id, {counts}
+            FROM rates
+            WHERE book_id IS NOT NULL
+            GROUP BY book_id
+        ) AS counted
+        WHERE book_rating_stats.book_id = counted.book_id
+    """)
+
+
+def downgrade() -> None:
+    for stars in reversed(STARS):
+        op.drop_column('book_rating_stats', f'rating_{stars}')
@@ -1,6 +1,7 @@
 import enum
 from sqlalchemy import Table, MetaData, Column, String, Integer, Text, Boolean, Date, ForeignKey, Float, DECIMAL, Enum, \
-    TIMESTAMP, DateTime
+    TIMESTAMP, DateTime, Index, Computed
+from sqlalchemy.dialects.postgresql import TSVECTOR
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime, date
 
@@ -28,6 +29,18 @@ superuser = Table(
     Column('is_superuser', Boolean, default=False),
 )
 
+# Full-text document for /search-books?mode=fulltext. Postgres has no Uzbek
+# configuration, the 'simple' part (no stemming) covers Uzbek titles.
+def _search_document(config):
+    return ' || '.join(
+        f"setweight(to_tsvector('{config}', coalesce({column}, '')), '{weight}')"
+        for column, weight in (('title', 'A'), ('author', 'B'), ('category', 'C'), ('description', 'D'))
+    )
+
+
+SEARCH_CONFIGS = ('russian', 'english', 'simple')
+SEARCH_VECTOR = ' || '.join(_search_document(config) for config in SEARCH_CONFIGS)
+
 # Book Table
 book = Table(
     'books',
@@ -41,10 +54,24 @@ book = Table(
     Column('description', String, default='description is not available'),
     Column('price', Float, default=0),
     Column('quantity', Integer, default=0),
+    # part of quantity held by shopping carts, see books/stock.py
+    Column('reserved', Integer, default=0, server_default='0', nullable=False),
+    # maintained by books/review_counts.py
+    Column('review_count', Integer, default=0, server_default='0', nullable=False),
     Column('language', String, default="Russian"),
     Column('added_at', TIMESTAMP, default=datetime.utcnow),
-    Column('barcode', String, index=True)
+    Column('barcode', String, index=True),
+    Column('search_vector', TSVECTOR, Computed(SEARCH_VECTOR, persisted=True)),
+    Index('ix_books_search_vector', 'search_vector', postgresql_using='gin'),
+    # fuzzy search, needs the pg_trgm extension (migration 5c1e7a2b9d34)
+    Index('ix_books_title_trgm', 'title', postgresql_using='gin', postgresql_ops={'title': 'gin_trgm_ops'}),
+    Index('ix_books_author_trgm', 'author', postgresql_using='gin', postgresql_ops={'author': 'gin_trgm_ops'}),
+    # keyset pagination for /book/get-books?sort=price_asc
+    Index('ix_books_price_id', 'price', 'id'),
 )
+# and for the descending sorts, which put NULLs last
+Index('ix_books_added_at_id', book.c.added_at.desc().nulls_last(), book.c.id.desc())
+Index('ix_books_price_desc_id', book.c.price.desc().nulls_last(), book.c.id.desc())
 
 categories = Table(
     'category',
@@ -88,7 +115,9 @@ shopping_cart = Table(
     Column('book_id', Integer, ForeignKey('books.id')),
     Column('quantity', Integer),
     Column('amount', Float),
-    Column('created_at', TIMESTAMP, default=datetime.utcnow)
+    Column('created_at', TIMESTAMP, default=datetime.utcnow),
+    # a user's cart in line order
+    Index('ix_shopping_cart_user_id_id', 'user_id', 'id'),
 )
 
 # Review Table
@@ -99,8 +128,10 @@ review = Table(
     Column('user_id', Integer, ForeignKey('users.id')),
     Column('book_id', Integer, ForeignKey('books.id')),
     Column('comments', String,default='no comments yet'),
-    Column('review_date', TIMESTAMP, default=datetime.utcnow)
+    Column('review_date', TIMESTAMP, default=datetime.utcnow),
 )
+# /get-comments pages through a book's reviews newest first, the undated ones last
+Index('ix_reviews_book_id_review_date', review.c.book_id, review.c.review_date.desc().nulls_last(), review.c.id.desc())
 
 # Promotion Table
 promotion = Table(
@@ -131,7 +162,23 @@ rate = Table(
     Column('id', Integer, primary_key=True, autoincrement=True),
     Column('user_id', Integer, ForeignKey('users.id')),
     Column('book_id', Integer, ForeignKey('books.id')),
-    Column('rating', Integer, default=1)
+    Column('rating', Integer, default=1),
+    Column('created_at', TIMESTAMP, default=datetime.utcnow),
+    # /get-rating filters by book or user and pages by id
+    Index('ix_rates_book_id_id', 'book_id', 'id'),
+    Index('ix_rates_user_id_id', 'user_id', 'id'),
+)
+
+# Rating aggregates per book, kept in step with rates (books/rating_stats.py)
+book_rating_stats = Table(
+    'book_rating_stats',
+    metadata,
+    Column('book_id', Integer, ForeignKey('books.id'), primary_key=True),
+    Column('rating_count', Integer, default=0, server_default='0', nullable=False),
+    Column('rating_sum', Integer, default=0, server_default='0', nullable=False),
+    Column('average_rating', DECIMAL, nullable=False),
+    # how many of the ratings gave 1 .. 5 stars
+    *(Column(f'rating_{stars}', Integer, default=0, server_default='0', nullable=False) for stars in range(1, 6))
 )
 
 
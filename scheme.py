@@ -1,6 +1,19 @@
+import enum
 from typing import Optional, List
 from datetime import datetime
-from pydantic import BaseModel
+from pydantic import BaseModel, model_validator
+
+
+class SearchModeEnum(enum.Enum):
+    substring = "substring"
+    fulltext = "fulltext"
+    fuzzy = "fuzzy"
+    index = "index"
+
+
+class LeaderboardEnum(enum.Enum):
+    top_rated = "top_rated"
+    trending = "trending"
 
 
 class ShoppingCartItem(BaseModel):
@@ -8,6 +21,30 @@ class ShoppingCartItem(BaseModel):
     quantity: int
 
 
+class CartActionEnum(enum.Enum):
+    add = "add"
+    increment = "increment"
+    decrement = "decrement"
+    remove = "remove"
+
+
+class CartOperation(BaseModel):
+    action: CartActionEnum
+    book_id: Optional[int] = None
+    cart_id: Optional[int] = None
+    quantity: int = 1
+
+    @model_validator(mode='after')
+    def check_target(self):
+        if (self.book_id is None) == (self.cart_id is None):
+            raise ValueError('Provide exactly one of book_id or cart_id')
+        if self.action == CartActionEnum.add and self.book_id is None:
+            raise ValueError('add needs a book_id')
+        if self.quantity < 1:
+            raise ValueError('Quantity must be positive')
+        return self
+
+
 class BooksList(BaseModel):
     id: int
     special_book_id: int
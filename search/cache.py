@@ -0,0 +1,93 @@
+import time
+from collections import OrderedDict
+
+from config import SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL
+from search.index import normalize
+
+
+def normalize_query(query: str) -> str:
+    # "  Гарри   ПОТТЕР " and "гарри поттер" share an entry
+    return ' '.join(normalize(query).split())
+
+
+class SearchCache:
+    """
+    Bounded LRU of search results with a TTL.
+
+    Entries hold the matching book ids only, the rows are rendered from the
+    catalog snapshot on every hit, so rating, price and quantity changes
+    need no invalidation. Which books match (and in which order) depends on
+    their text alone: only a change to a book's title, author, category or
+    description, a removal or a reload drops the entries.
+
+    `generation` counts those drops. Read it before running the query and
+    hand it to put(): a result computed across a drop is not stored.
+    """
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._texts = {}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires, value = entry
+            if expires > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key, generation: int, value):
+        if self.size <= 0 or generation != self.generation:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.generation += 1
+
+    @staticmethod
+    def _text(record):
+        return record.title, record.author, record.category, record.description
+
+    def rebuild(self, books):
+        self._texts = {book_id: self._text(record) for book_id, record in books.items()}
+        self.clear()
+
+    def upsert(self, record):
+        text = self._text(record)
+        if self._texts.get(record.id) != text:
+            self._texts[record.id] = text
+            self.clear()
+
+    def remove(self, book_id: int):
+        self._texts.pop(book_id, None)
+        self.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0
+        }
+
+
+search_cache = SearchCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
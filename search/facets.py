@@ -0,0 +1,167 @@
+from bisect import bisect_left, bisect_right, insort
+
+FACETS = ('category', 'language', 'age')
+
+
+def _facet_values(record):
+    return {
+        'category': [record.category] if record.category else [],
+        'language': [record.language] if record.language else [],
+        'age': list(record.ages or []),
+    }
+
+
+def _bitmap(slots, size):
+    bits = bytearray((size + 7) // 8)
+    for slot in slots:
+        bits[slot >> 3] |= 1 << (slot & 7)
+    return int.from_bytes(bits, 'little')
+
+
+def _set_slots(bitmap, offset, limit):
+    # positions of the set bits, lowest first
+    bits = bin(bitmap)[:1:-1]
+    slots = []
+    position = bits.find('1')
+    skipped = 0
+    while position != -1 and len(slots) < limit:
+        if skipped < offset:
+            skipped += 1
+        else:
+            slots.append(position)
+        position = bits.find('1', position + 1)
+    return slots
+
+
+class FacetIndex:
+    """
+    Bitmap index over the catalog for faceted search.
+
+    Every book gets a slot (assigned in id order on rebuild, appended for new
+    books) and every facet value a Python int with the slots of its books
+    set. Filtering is AND-ing the OR of the selected values per facet; a
+    facet's counts are popcounts with every filter applied except its own,
+    so selecting a category still shows how many books the other categories
+    have.
+    """
+
+    def __init__(self):
+        self._slots = {}
+        self._book_ids = []
+        self._values = {}
+        self._bitmaps = {facet: {} for facet in FACETS}
+        self._prices = []
+        self._slot_prices = {}
+        self._all = 0
+
+    def rebuild(self, books):
+        self._book_ids = sorted(books)
+        self._slots = {book_id: slot for slot, book_id in enumerate(self._book_ids)}
+        self._values = {}
+        members = {facet: {} for facet in FACETS}
+        prices = []
+        for slot, book_id in enumerate(self._book_ids):
+            record = books[book_id]
+            values = _facet_values(record)
+            self._values[book_id] = values
+            for facet in FACETS:
+                for value in values[facet]:
+                    members[facet].setdefault(value, []).append(slot)
+            prices.append((record.price or 0, slot))
+
+        size = len(self._book_ids)
+        self._bitmaps = {
+            facet: {value: _bitmap(slots, size) for value, slots in members[facet].items()}
+            for facet in FACETS
+        }
+        self._slot_prices = {slot: price for price, slot in prices}
+        prices.sort()
+        self._prices = prices
+        self._all = (1 << size) - 1
+
+    def _clear(self, book_id, slot):
+        bit = 1 << slot
+        for facet, values in self._values.pop(book_id, {}).items():
+            for value in values:
+                bitmap = self._bitmaps[facet][value] & ~bit
+                if bitmap:
+                    self._bitmaps[facet][value] = bitmap
+                else:
+                    del self._bitmaps[facet][value]
+        entry = (self._slot_prices.pop(slot, 0), slot)
+        position = bisect_left(self._prices, entry)
+        if position < len(self._prices) and self._prices[position] == entry:
+            del self._prices[position]
+
+    def upsert(self, record):
+        slot = self._slots.get(record.id)
+        if slot is None:
+            slot = len(self._book_ids)
+            self._book_ids.append(record.id)
+            self._slots[record.id] = slot
+        else:
+            self._clear(record.id, slot)
+
+        bit = 1 << slot
+        values = _facet_values(record)
+        self._values[record.id] = values
+        for facet in FACETS:
+            for value in values[facet]:
+                self._bitmaps[facet][value] = self._bitmaps[facet].get(value, 0) | bit
+        self._slot_prices[slot] = record.price or 0
+        insort(self._prices, (self._slot_prices[slot], slot))
+        self._all |= bit
+
+    def remove(self, book_id: int):
+        # the slot stays allocated (and empty) until the next rebuild
+        slot = self._slots.pop(book_id, None)
+        if slot is None:
+            return
+        self._clear(book_id, slot)
+        self._book_ids[slot] = None
+        self._all &= ~(1 << slot)
+
+    def search(self, filters: dict, price_min=None, price_max=None, book_ids=None, offset=0, limit=20):
+        """
+        filters is {facet: [values]}, book_ids optionally limits the search
+        (e.g. to text search matches). Returns (page of book ids, total, counts).
+        """
+        size = len(self._book_ids)
+        base = self._all
+        if price_min is not None or price_max is not None:
+            start = 0 if price_min is None else bisect_left(self._prices, (price_min, -1))
+            end = len(self._prices) if price_max is None else bisect_right(self._prices, (price_max, size))
+            base &= _bitmap((slot for _, slot in self._prices[start:end]), size)
+        if book_ids is not None:
+            base &= _bitmap((self._slots[book_id] for book_id in book_ids if book_id in self._slots), size)
+
+        selected = {}
+        for facet in FACETS:
+            values = filters.get(facet)
+            if values:
+                mask = 0
+                for value in values:
+                    mask |= self._bitmaps[facet].get(value, 0)
+                selected[facet] = mask
+
+        result = base
+        for mask in selected.values():
+            result &= mask
+
+        counts = {}
+        for facet in FACETS:
+            others = base
+            for other, mask in selected.items():
+                if other != facet:
+                    others &= mask
+            counts[facet] = {
+                value: count
+                for value, bitmap in self._bitmaps[facet].items()
+                if (count := (others & bitmap).bit_count())
+            }
+
+        page = [self._book_ids[slot] for slot in _set_slots(result, offset, limit)]
+        return page, result.bit_count(), counts
+
+
+facet_index = FacetIndex()
@@ -0,0 +1,121 @@
+import re
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right, insort
+
+TOKEN_RE = re.compile(r'\w+')
+# a one letter prefix could otherwise merge half of the vocabulary
+PREFIX_EXPANSION_LIMIT = 64
+
+
+def normalize(text: str) -> str:
+    return unicodedata.normalize('NFKC', text).casefold()
+
+
+def tokenize(text) -> list:
+    return TOKEN_RE.findall(normalize(text)) if text else []
+
+
+def _intersect(small, large):
+    # walk the shorter list and binary search the longer one from the last hit on
+    result = array('I')
+    low = 0
+    for book_id in small:
+        low = bisect_left(large, book_id, low)
+        if low == len(large):
+            break
+        if large[low] == book_id:
+            result.append(book_id)
+    return result
+
+
+class InvertedIndex:
+    """
+    Token -> sorted book ids over title, author and category of the catalog.
+
+    Posting lists are array('I') of book ids in ascending order. Every query
+    token has to match a whole word; the last one may also be the start of a
+    word so partially typed words still find books.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._book_tokens = {}
+        self._vocabulary = None
+
+    @staticmethod
+    def _tokens(record):
+        return set(tokenize(record.title) + tokenize(record.author) + tokenize(record.category))
+
+    def rebuild(self, books):
+        postings = {}
+        book_tokens = {}
+        for book_id in sorted(books):
+            tokens = self._tokens(books[book_id])
+            book_tokens[book_id] = tokens
+            for token in tokens:
+                postings.setdefault(token, array('I')).append(book_id)
+        self._postings = postings
+        self._book_tokens = book_tokens
+        self._vocabulary = None
+
+    def upsert(self, record):
+        self.remove(record.id)
+        tokens = self._tokens(record)
+        self._book_tokens[record.id] = tokens
+        for token in tokens:
+            postings = self._postings.get(token)
+            if postings is None:
+                self._postings[token] = array('I', [record.id])
+                self._vocabulary = None
+            else:
+                insort(postings, record.id)
+
+    def remove(self, book_id: int):
+        for token in self._book_tokens.pop(book_id, ()):
+            postings = self._postings[token]
+            position = bisect_left(postings, book_id)
+            if position < len(postings) and postings[position] == book_id:
+                del postings[position]
+            if not postings:
+                del self._postings[token]
+                self._vocabulary = None
+
+    def _prefix_postings(self, prefix: str):
+        if self._vocabulary is None:
+            self._vocabulary = sorted(self._postings)
+        # the prefix itself, when it is a word, sorts first and is never cut off
+        start = bisect_left(self._vocabulary, prefix)
+        end = bisect_right(self._vocabulary, prefix + '\U0010ffff', start)
+        terms = self._vocabulary[start:min(end, start + PREFIX_EXPANSION_LIMIT)]
+        if len(terms) == 1:
+            return self._postings[terms[0]]
+        return array('I', sorted(set().union(*(self._postings[term] for term in terms))))
+
+    def search(self, query: str) -> array:
+        tokens = tokenize(query)
+        if not tokens:
+            return array('I')
+
+        # the last word may still be typed: "pot" is a word of its own but should find "potter" too
+        *words, prefix = tokens
+        lists = [self._postings.get(token, array('I')) for token in set(words)]
+
+        if not lists:
+            return self._prefix_postings(prefix)
+
+        lists.sort(key=len)
+        result = lists[0]
+        for postings in lists[1:]:
+            if not result:
+                break
+            result = _intersect(result, postings)
+
+        # the other words already narrowed it down, check the prefix on those books only
+        return array('I', (
+            book_id for book_id in result
+            if any(token.startswith(prefix) for token in self._book_tokens[book_id])
+        ))
+
+
+search_index = InvertedIndex()
@@ -0,0 +1,123 @@
+import heapq
+from bisect import bisect_left, insort
+
+from search.index import normalize
+
+TITLE = 0
+AUTHOR = 1
+
+# results for prefixes up to this length are kept until one of their books changes, they match the most entries
+SUGGEST_CACHED_PREFIX = 3
+
+
+def _keys(text):
+    # the whole normalized text and every tail starting at a word, so "толс" finds "Лев Толстой"
+    words = normalize(text).split()
+    return {' '.join(words[start:]) for start in range(len(words))}
+
+
+class SuggestIndex:
+    """
+    Sorted array of (normalized key, book id, kind) for search-as-you-type.
+
+    A prefix is a contiguous slice found with bisect; the whole slice is
+    ranked by popularity, the number of ratings of the book (for authors
+    the sum over their books). Short prefixes have the longest slices, their
+    results are cached per prefix and dropped when a book whose keys start
+    with that prefix changes.
+    """
+
+    def __init__(self):
+        self._entries = []
+        self._book_entries = {}
+        self._texts = {}
+        self._popularity = {}
+        self._cache = {}
+
+    def _entries_for(self, record):
+        entries = []
+        if record.title:
+            entries.extend((key, record.id, TITLE) for key in _keys(record.title))
+        if record.author:
+            entries.extend((key, record.id, AUTHOR) for key in _keys(record.author))
+        return entries
+
+    def rebuild(self, books):
+        entries = []
+        self._book_entries = {}
+        self._texts = {}
+        self._popularity = {}
+        for record in books.values():
+            book_entries = self._entries_for(record)
+            entries.extend(book_entries)
+            self._book_entries[record.id] = book_entries
+            self._texts[record.id] = (record.title, record.author)
+            self._popularity[record.id] = record.rating_count or 0
+        entries.sort()
+        self._entries = entries
+        self._cache = {}
+
+    def _forget(self, entries):
+        # the cached prefixes these entries fall under
+        for key, _, _ in entries:
+            for length in range(1, min(len(key), SUGGEST_CACHED_PREFIX) + 1):
+                self._cache.pop(key[:length], None)
+
+    def upsert(self, record):
+        self.remove(record.id)
+        book_entries = self._entries_for(record)
+        for entry in book_entries:
+            insort(self._entries, entry)
+        self._book_entries[record.id] = book_entries
+        self._texts[record.id] = (record.title, record.author)
+        self._popularity[record.id] = record.rating_count or 0
+        self._forget(book_entries)
+
+    def remove(self, book_id: int):
+        book_entries = self._book_entries.pop(book_id, ())
+        for entry in book_entries:
+            position = bisect_left(self._entries, entry)
+            if position < len(self._entries) and self._entries[position] == entry:
+                del self._entries[position]
+        self._texts.pop(book_id, None)
+        self._popularity.pop(book_id, None)
+        self._forget(book_entries)
+
+    def suggest(self, prefix: str, limit: int):
+        prefix = ' '.join(normalize(prefix).split())
+        if not prefix:
+            return []
+        if len(prefix) <= SUGGEST_CACHED_PREFIX:
+            by_limit = self._cache.setdefault(prefix, {})
+            cached = by_limit.get(limit)
+            if cached is None:
+                cached = by_limit[limit] = self._suggest(prefix, limit)
+            return cached
+        return self._suggest(prefix, limit)
+
+    def _suggest(self, prefix: str, limit: int):
+        start = bisect_left(self._entries, (prefix,))
+        end = bisect_left(self._entries, (prefix + '\U0010ffff',), start)
+
+        titles = {}
+        authors = {}
+        for _, book_id, kind in self._entries[start:end]:
+            title, author = self._texts[book_id]
+            popularity = self._popularity[book_id]
+            if kind == TITLE:
+                if title not in titles or titles[title][0] < popularity:
+                    titles[title] = (popularity, book_id)
+            elif book_id not in authors.setdefault(author, {}):
+                authors[author][book_id] = popularity
+
+        candidates = [
+            (popularity, {"text": title, "kind": "title", "book_id": book_id})
+            for title, (popularity, book_id) in titles.items()
+        ] + [
+            (sum(books.values()), {"text": author, "kind": "author", "book_id": None})
+            for author, books in authors.items()
+        ]
+        return [suggestion for _, suggestion in heapq.nlargest(limit, candidates, key=lambda c: c[0])]
+
+
+suggest_index = SuggestIndex()
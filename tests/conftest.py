@@ -0,0 +1,76 @@
+import os
+import sys
+
+import pytest
+from sqlalchemy.dialects.postgresql import asyncpg
+
+# config.py builds the database URL at import time, no connection is made in these tests
+for name, value in {
+    'DB_NAME': 'test', 'DB_USER': 'test', 'DB_PASSWORD': 'test', 'DB_HOST': 'localhost', 'DB_PORT': '5432',
+    'SECRET': 'test',
+}.items():
+    os.environ.setdefault(name, value)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeRow:
+    """Attribute, `_mapping` and tuple access, like a result row."""
+
+    def __init__(self, **values):
+        self.__dict__.update(values)
+        self._mapping = values
+
+    def __iter__(self):
+        return iter(self._mapping.values())
+
+
+class FakeResult:
+    def __init__(self, rows):
+        self.rows = rows
+        self.rowcount = len(rows)
+
+    def fetchall(self):
+        return self.rows
+
+    def all(self):
+        return self.rows
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def scalar(self):
+        row = self.first()
+        return next(iter(row)) if isinstance(row, FakeRow) else row
+
+    def scalars(self):
+        return FakeResult([next(iter(row)) if isinstance(row, FakeRow) else row for row in self.rows])
+
+
+class FakeSession:
+    """
+    Answers the statements with the given results in order, [] once they run
+    out, and keeps each statement compiled the way asyncpg gets it.
+    """
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.statements = []
+        self.committed = False
+
+    async def execute(self, statement, parameters=None):
+        self.statements.append(str(statement.compile(dialect=asyncpg.dialect())))
+        return FakeResult(self.results.pop(0) if self.results else [])
+
+    async def commit(self):
+        self.committed = True
+
+
+@pytest.fixture
+def fake_session():
+    return FakeSession
+
+
+@pytest.fixture
+def fake_row():
+    return FakeRow
@@ -0,0 +1,87 @@
+import asyncio
+import datetime as dt
+
+from books.books import _browse_books
+from books.scheme import BookSortEnum
+
+
+def browse(session, sort, cursor):
+    return asyncio.run(_browse_books(session, sort, 2, cursor, {'id', 'added_at', 'price'}))
+
+
+def test_newest_follows_next_cursor(fake_session, fake_row):
+    added = dt.datetime(2024, 5, 1, 12, 30, 15, 123456)
+    session = fake_session(
+        [
+            fake_row(id=3, added_at=added, price=None),
+            fake_row(id=2, added_at=added - dt.timedelta(days=1), price=None),
+            fake_row(id=1, added_at=added - dt.timedelta(days=2), price=None),
+        ],
+        [fake_row(id=1, added_at=added - dt.timedelta(days=2), price=None)],
+    )
+
+    first = browse(session, BookSortEnum.newest, None)
+    assert [b['id'] for b in first['books']] == [3, 2]
+    assert first['next_cursor']
+
+    second = browse(session, BookSortEnum.newest, first['next_cursor'])
+    assert [b['id'] for b in second['books']] == [1]
+    assert second['next_cursor'] is None
+    # a full first page doesn't look at the NULLs
+    values_page, next_values_page, nulls_page = session.statements
+    assert 'WHERE books.added_at IS NOT NULL ORDER BY books.added_at DESC NULLS LAST, books.id DESC' \
+        in values_page
+    assert '(books.added_at, books.id) < ($1::TIMESTAMP WITHOUT TIME ZONE, $2::INTEGER)' in next_values_page
+    assert 'WHERE books.added_at IS NULL ORDER BY books.id DESC' in nulls_page
+
+
+def test_deep_pages_are_one_index_range(fake_session, fake_row):
+    session = fake_session([fake_row(id=i, added_at=None, price=10.0) for i in (5, 6, 7)])
+
+    page = browse(session, BookSortEnum.price_asc, None)
+    browse(session, BookSortEnum.price_asc, page['next_cursor'])
+
+    assert all(' OR ' not in statement for statement in session.statements)
+
+
+def test_page_ending_on_null_sort_value(fake_session, fake_row):
+    session = fake_session(
+        # values run out after book 5, the page is filled up from the NULLs
+        [fake_row(id=5, added_at=None, price=10.0)],
+        [fake_row(id=7, added_at=None, price=None), fake_row(id=9, added_at=None, price=None)],
+        [fake_row(id=9, added_at=None, price=None)],
+    )
+
+    first = browse(session, BookSortEnum.price_asc, None)
+    assert [b['id'] for b in first['books']] == [5, 7]
+    assert 'WHERE books.price IS NULL ORDER BY books.id' in session.statements[1]
+
+    second = browse(session, BookSortEnum.price_asc, first['next_cursor'])
+    assert [b['id'] for b in second['books']] == [9]
+    # after a NULL price only the remaining NULL prices are left, in id order
+    assert len(session.statements) == 3
+    assert 'WHERE books.price IS NULL AND books.id > $1::INTEGER ORDER BY books.id' in session.statements[2]
+
+
+def test_unrated_book_rating_matches_snapshot(fake_row):
+    from books.catalog import BookRecord
+    from books.queries import book_row_to_dict
+
+    row = fake_row(
+        id=1, special_book_id=10, title='t', author='a', publication_date=None, quantity=1, description='d',
+        price=1.0, barcode='12345678', language='Russian', category='c', added_at=None, average_rating=None,
+        rating_count=0, ages=None, photos=None
+    )
+    assert BookRecord(row, [], []).to_dict()['average_rating'] == book_row_to_dict(row)['average_rating'] == 0
+
+
+def test_sort_without_limit_browses(fake_session, fake_row, monkeypatch):
+    import books.books
+
+    monkeypatch.setattr(books.books, 'render', lambda request, page: page)
+    session = fake_session([fake_row(id=7, added_at=None, price=1.0)])
+
+    page = asyncio.run(books.books.get_books(None, None, BookSortEnum.price_asc, None, 'id,price', session))
+
+    assert [b['id'] for b in page['books']] == [7]
+    assert 'ORDER BY books.price ASC NULLS LAST' in session.statements[0]
@@ -0,0 +1,37 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from books.books import bulk_delete_books
+from books.catalog import catalog
+from books.scheme import BulkDeleteBooks
+
+
+def bulk_delete(session):
+    return asyncio.run(bulk_delete_books(BulkDeleteBooks(book_ids=[3, 4]), {'user_id': 1}, session))
+
+
+def test_books_with_orders_are_kept(fake_session):
+    # admin check, locked books, ordered books
+    session = fake_session([1], [3, 4], [3])
+
+    with pytest.raises(HTTPException) as error:
+        bulk_delete(session)
+
+    assert error.value.status_code == 409
+    assert '[3]' in error.value.detail
+    assert not any(statement.startswith('DELETE') for statement in session.statements)
+    assert not session.committed
+
+
+def test_cart_stock_released_before_cart_lines_deleted(fake_session, monkeypatch):
+    session = fake_session([1], [3, 4], [])
+    monkeypatch.setattr(catalog, 'remove', lambda *book_ids: None)
+
+    bulk_delete(session)
+
+    release = next(i for i, s in enumerate(session.statements) if s.startswith('UPDATE books SET reserved'))
+    delete_cart = next(i for i, s in enumerate(session.statements) if s.startswith('DELETE FROM shopping_cart'))
+    assert release < delete_cart
+    assert session.committed
@@ -0,0 +1,23 @@
+import asyncio
+from datetime import datetime
+
+from books.cart_expiry import expire_carts
+
+
+def test_releases_stock_before_deleting_stale_lines(fake_session):
+    session = fake_session([4, 5])
+
+    assert asyncio.run(expire_carts(session, datetime(2024, 5, 1))) == 2
+
+    select_stale, release, delete = session.statements
+    assert 'FOR UPDATE SKIP LOCKED' in select_stale
+    assert 'orders.shopping_cart_id = shopping_cart.id' in select_stale
+    assert release.startswith('UPDATE books SET reserved=greatest(books.reserved - ')
+    assert delete.startswith('DELETE FROM shopping_cart')
+
+
+def test_nothing_stale(fake_session):
+    session = fake_session([])
+
+    assert asyncio.run(expire_carts(session, datetime(2024, 5, 1))) == 0
+    assert len(session.statements) == 1
@@ -0,0 +1,40 @@
+import asyncio
+
+from auth.auth import delete_user
+from books.catalog import catalog
+from books.leaderboard import Leaderboards, TOP_RATED, TRENDING, leaderboards
+
+
+def test_rated_books_refreshed_after_commit(fake_session, fake_row, monkeypatch):
+    ratings = [
+        fake_row(book_id=8, rating=5, created_at=None), fake_row(book_id=None, rating=3, created_at=None),
+        fake_row(book_id=7, rating=4, created_at=None), fake_row(book_id=8, rating=1, created_at=None),
+    ]
+    # admin check, user check, the user's rates
+    session = fake_session([1], [2], ratings)
+    refreshed, forgotten = [], []
+
+    async def refresh_book(session_, *book_ids):
+        assert session.committed
+        refreshed.extend(book_ids)
+
+    monkeypatch.setattr(catalog, 'refresh_book', refresh_book)
+    monkeypatch.setattr(leaderboards, 'forget_ratings', forgotten.extend)
+
+    asyncio.run(delete_user(2, session, {'user_id': 1}))
+
+    assert refreshed == [7, 8]
+    assert forgotten == [ratings[0], ratings[2], ratings[3]]
+
+
+def test_forgotten_ratings_leave_the_rankings():
+    boards = Leaderboards(prior_weight=0, half_life_days=7)
+    boards.loaded = True
+    rated_at = boards.epoch
+    for book_id, rating in ((1, 5), (1, 1), (2, 4), (3, 2)):
+        boards.record_rating(book_id, rating, rated_at)
+
+    boards.forget_ratings([(1, 1, rated_at), (3, 2, rated_at)])
+
+    assert boards.top(TOP_RATED, None, 10) == [(1, 5.0), (2, 4.0)]
+    assert [book_id for book_id, _ in boards.top(TRENDING, None, 10)] == [1, 2]
@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+
+from books.books import adjust_inventory
+from books.catalog import catalog
+from books.scheme import InventoryAdjustment
+
+
+@pytest.fixture(autouse=True)
+def no_catalog(monkeypatch):
+    monkeypatch.setattr(catalog, 'set_quantities', lambda quantities: None)
+
+
+def adjust(session, *adjustments):
+    return asyncio.run(adjust_inventory([InventoryAdjustment(**a) for a in adjustments], session, {'user_id': 1}))
+
+
+def test_id_and_barcode_of_the_same_book_are_duplicates(fake_session, fake_row):
+    # staff check, barcode lookup, update
+    session = fake_session(
+        [fake_row(id=1)],
+        [fake_row(barcode='4006381333931', id=5)],
+        [fake_row(idx=0, id=5, quantity=12)],
+    )
+
+    results = adjust(session, {'book_id': 5, 'delta': 2}, {'barcode': '4006381333931', 'delta': 3})
+
+    assert results[0]['status'] == 'ok'
+    assert results[1] == {
+        "index": 1, "status": "error", "detail": 'Duplicate entry for this book, already adjusted by entry 0'
+    }
+
+
+def test_barcode_of_several_books_is_rejected(fake_session, fake_row):
+    session = fake_session([fake_row(id=1)], [fake_row(barcode='111', id=5), fake_row(barcode='111', id=6)])
+
+    results = adjust(session, {'barcode': '111', 'quantity': 3})
+
+    assert results == [{"index": 0, "status": "error", "detail": 'Barcode matches more than one book'}]
+
+
+def test_delta_only_batch_casts_the_null_quantity_column(fake_session, fake_row):
+    session = fake_session([fake_row(id=1)], [fake_row(idx=0, id=5, quantity=12), fake_row(idx=1, id=6, quantity=1)])
+
+    adjust(session, {'book_id': 5, 'delta': 2}, {'book_id': 6, 'delta': -1})
+
+    update = session.statements[1]
+    assert 'VALUES ($1::INTEGER, $2::INTEGER, $3::INTEGER, NULL), ($4::INTEGER, $5::INTEGER, $6::INTEGER, NULL)' \
+        in update
+    assert 'CASE WHEN (CAST(entries.quantity AS INTEGER) IS NOT NULL) THEN CAST(entries.quantity AS INTEGER) ' \
+           'ELSE books.quantity + CAST(entries.delta AS INTEGER) END' in update
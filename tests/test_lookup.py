@@ -0,0 +1,22 @@
+import asyncio
+
+from books.catalog import catalog
+from books.lookup import lookup_books
+
+
+def test_books_missing_from_the_snapshot_are_refreshed_together(fake_session, monkeypatch):
+    refreshed = []
+
+    async def get_books(session):
+        return {}
+
+    async def refresh_book(session, *book_ids):
+        refreshed.append(book_ids)
+
+    monkeypatch.setattr(catalog, 'get_books', get_books)
+    monkeypatch.setattr(catalog, 'refresh_book', refresh_book)
+    session = fake_session([7, 9])
+
+    asyncio.run(lookup_books(session, ['missing-barcode'], [404]))
+
+    assert refreshed == [(7, 9)]
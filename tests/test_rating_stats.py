@@ -0,0 +1,28 @@
+import asyncio
+
+from books.rating_stats import remove_ratings, rebuild_rating_stats
+from models.model import rate
+
+
+def test_removing_the_last_rating_keeps_average_not_null(fake_session):
+    session = fake_session()
+
+    asyncio.run(remove_ratings(session, rate.c.user_id == 2))
+
+    update, delete = session.statements
+    # a book losing its last rating gets 0 instead of a NULL average, then the DELETE removes it
+    assert 'average_rating=coalesce(CAST(book_rating_stats.rating_sum - anon_1.rating_sum AS DECIMAL) / ' \
+           'CAST(nullif(book_rating_stats.rating_count - anon_1.rating_count, $1::INTEGER) AS NUMERIC), ' \
+           '$2::INTEGER)' in update
+    assert 'coalesce(sum(rates.rating), $' in update
+    assert delete.startswith('DELETE FROM book_rating_stats WHERE book_rating_stats.rating_count <= ')
+
+
+def test_rebuild_of_books_with_only_null_ratings(fake_session):
+    session = fake_session()
+
+    asyncio.run(rebuild_rating_stats(session))
+
+    insert = session.statements[2]
+    assert 'coalesce(sum(rates.rating), $' in insert
+    assert 'coalesce(avg(rates.rating), $' in insert
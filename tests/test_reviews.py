@@ -0,0 +1,39 @@
+import asyncio
+from datetime import datetime
+
+from main import get_reviews
+from utilities import encode_cursor, decode_cursor
+
+
+def review_row(fake_row, id, review_date, review_count=3):
+    return fake_row(review_count=review_count, id=id, user_id=1, comments='ok', review_date=review_date)
+
+
+def test_undated_reviews_follow_the_dated_ones(fake_session, fake_row):
+    # book with its dated page, then the undated reviews
+    session = fake_session(
+        [review_row(fake_row, 4, datetime(2026, 10, 1))],
+        [fake_row(id=9, user_id=1, comments='ok', review_date=None),
+         fake_row(id=2, user_id=1, comments='ok', review_date=None)],
+    )
+
+    page = asyncio.run(get_reviews(book_id=1, limit=2, cursor=None, session=session))
+
+    assert [r['review_date'] for r in page['reviews']] == [datetime(2026, 10, 1), None]
+    assert decode_cursor(page['next_cursor']) == [None, 9]
+    assert 'reviews.review_date IS NOT NULL' in session.statements[0]
+    assert 'reviews.review_date DESC NULLS LAST' in session.statements[0]
+    assert 'reviews.review_date IS NULL' in session.statements[1]
+    assert 'LIMIT $2::INTEGER' in session.statements[1]
+
+
+def test_cursor_in_the_undated_reviews(fake_session, fake_row):
+    session = fake_session([review_row(fake_row, 2, None)])
+
+    page = asyncio.run(get_reviews(book_id=1, limit=2, cursor=encode_cursor(None, 9), session=session))
+
+    assert [r['review_date'] for r in page['reviews']] == [None]
+    assert page['next_cursor'] is None
+    # only the undated range is read
+    assert len(session.statements) == 1
+    assert 'reviews.review_date IS NULL AND reviews.id < $1::INTEGER' in session.statements[0]
@@ -0,0 +1,43 @@
+from types import SimpleNamespace
+
+from search.cache import SearchCache
+
+
+def record(book_id, title='Harry Potter', average_rating=0):
+    return SimpleNamespace(
+        id=book_id, title=title, author='Rowling', category='fantasy', description='', average_rating=average_rating
+    )
+
+
+def loaded_cache():
+    cache = SearchCache(size=10, ttl=60)
+    cache.rebuild({1: record(1), 2: record(2)})
+    cache.put('potter', cache.generation, [1, 2])
+    return cache
+
+
+def test_rating_change_keeps_entries():
+    cache = loaded_cache()
+
+    cache.upsert(record(1, average_rating=5))
+
+    assert cache.get('potter') == [1, 2]
+
+
+def test_text_change_drops_entries():
+    cache = loaded_cache()
+
+    cache.upsert(record(2, title='Hobbit'))
+
+    assert cache.get('potter') is None
+
+
+def test_result_computed_across_a_drop_is_not_stored():
+    cache = loaded_cache()
+    generation = cache.generation
+
+    # a new book lands while the query runs
+    cache.upsert(record(3))
+    cache.put('harry', generation, [1, 2])
+
+    assert cache.get('harry') is None
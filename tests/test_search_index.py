@@ -0,0 +1,24 @@
+from types import SimpleNamespace
+
+from search.index import InvertedIndex
+
+
+def index_of(*titles):
+    index = InvertedIndex()
+    index.rebuild({
+        book_id: SimpleNamespace(id=book_id, title=title, author=None, category=None)
+        for book_id, title in enumerate(titles, 1)
+    })
+    return index
+
+
+def test_last_word_matches_as_word_and_prefix():
+    index = index_of('Pot', 'Harry Potter', 'Potato soup')
+
+    assert list(index.search('pot')) == [1, 2, 3]
+
+
+def test_last_word_prefix_after_other_words():
+    index = index_of('Harry Pot', 'Harry Potter', 'Harry Houdini')
+
+    assert list(index.search('harry pot')) == [1, 2]
@@ -0,0 +1,26 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+from books import stock
+
+
+def test_commit_takes_sold_copies_out_of_reserved_and_quantity(fake_session, fake_row):
+    session = fake_session([fake_row(id=3, quantity=8), fake_row(id=4, quantity=0)])
+
+    assert asyncio.run(stock.commit(session, {3: 2, 4: 1})) == {3: 8, 4: 0}
+
+    update, = session.statements
+    assert 'SET quantity=(books.quantity - entries.count), reserved=(books.reserved - entries.count)' in update
+    assert 'AND books.reserved >= entries.count RETURNING books.id, books.quantity' in update
+
+
+def test_commit_is_all_or_nothing(fake_session, fake_row):
+    # book 4 doesn't have enough copies reserved
+    session = fake_session([fake_row(id=3, quantity=8)])
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(stock.commit(session, {3: 2, 4: 1}))
+
+    assert error.value.detail == 'Not enough reserved books'
@@ -0,0 +1,29 @@
+from types import SimpleNamespace
+
+from search.suggest import SuggestIndex
+
+
+def record(book_id, title, rating_count=0, author=None):
+    return SimpleNamespace(id=book_id, title=title, author=author, rating_count=rating_count)
+
+
+def test_most_popular_wins_past_the_first_entries():
+    books = {book_id: record(book_id, f'aa{book_id:04d}', 1) for book_id in range(1, 1001)}
+    books[5000] = record(5000, 'azure', 1000)
+    index = SuggestIndex()
+    index.rebuild(books)
+
+    assert index.suggest('a', 1) == [{"text": "azure", "kind": "title", "book_id": 5000}]
+
+
+def test_rating_change_refreshes_cached_prefix():
+    index = SuggestIndex()
+    index.rebuild({1: record(1, 'Alpha', 5), 2: record(2, 'Amber', 1), 3: record(3, 'Beta', 1)})
+    assert index.suggest('a', 1)[0]['book_id'] == 1
+    index.suggest('b', 1)
+
+    index.upsert(record(2, 'Amber', 9))
+
+    assert index.suggest('a', 1)[0]['book_id'] == 2
+    # prefixes the book doesn't fall under stay cached
+    assert 'b' in index._cache
@@ -1,7 +1,14 @@
+import base64
+import binascii
+import json
 import secrets
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, date
+from decimal import Decimal
 
-from fastapi import Depends, HTTPException
+import msgpack
+import orjson
+from fastapi import Depends, HTTPException, Request
+from fastapi.responses import JSONResponse, Response
 import aiofiles
 from config import SECRET
 import jwt
@@ -48,6 +55,68 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
         raise HTTPException(status_code=401, detail='Token invalid!')
 
 
+def encode_cursor(*values):
+    raw = json.dumps(values, default=str, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    if not isinstance(values, list) or not values:
+        raise HTTPException(status_code=400, detail='Invalid cursor')
+    return values
+
+
+def _orjson_default(value):
+    # postgres round()/avg() come back as Decimal
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=_orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    orjson-backed JSON response, the app's default response class.
+
+    Returning it directly from a route also skips FastAPI's response_model
+    validation and jsonable_encoder pass, so hot list endpoints return
+    their already shaped rows with it.
+    """
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def _msgpack_default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError
+
+
+class MsgPackResponse(Response):
+    media_type = 'application/msgpack'
+
+    def render(self, content) -> bytes:
+        return msgpack.packb(content, default=_msgpack_default, use_bin_type=True)
+
+
+def render(request: Request, content, headers: dict = None):
+    # MessagePack for clients that ask for it, JSON otherwise
+    headers = {**(headers or {}), 'Vary': 'Accept'}
+    if 'application/msgpack' in request.headers.get('accept', ''):
+        return MsgPackResponse(content, headers=headers)
+    return FastJSONResponse(content, headers=headers)
+
+
 # Directory for storing uploaded files
 
 UPLOAD_DIR = "app/static/images"